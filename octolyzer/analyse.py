@@ -1,5 +1,6 @@
 import os
 import sys
+import shutil
 
 SCRIPT_PATH = os.path.realpath(os.path.dirname(__file__))
 MODULE_PATH = "\\".join(SCRIPT_PATH.split('\\')[:-1])
@@ -921,8 +922,9 @@ NOTE:Subregion volumes will not be computed for CVI map."""
         # Plot core maps into single plot and save out
         if collate_segmentations and map_flags[0]==1:
             fig = grid.plot_multiple_grids(ctmap_args)
-            fig.savefig(os.path.join(save_path, fname+'.png'), bbox_inches="tight", transparent=False)
-            fig.savefig(os.path.join(segmentation_directory, fname+'.png'), bbox_inches="tight", transparent=False)
+            # Render once, then copy to the segmentation directory
+            grid._savefig(fig, os.path.join(save_path, fname+'.png'), bbox_inches="tight", transparent=False)
+            shutil.copyfile(os.path.join(save_path, fname+'.png'), os.path.join(segmentation_directory, fname+'.png'))
         plt.close()
 
         # Add choroid Ppole traces to retinal segmentations
@@ -1,20 +1,324 @@
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import torch
-import sys
-import cv2
-import scipy
-import copy
-from PIL import Image, ImageOps
-from eyepy.core import utils as eyepy_utils
-from eyepy.io.he import vol_reader
-from skimage import segmentation, morphology
-from pathlib import Path, WindowsPath, PosixPath
-from octolyzer import utils
-from octolyzer.measure.slo import slo_measurement
-from octolyzer.segment.sloseg import slo_inference, avo_inference, fov_inference
+from pathlib import WindowsPath, PosixPath
+
+# torch, cv2, pandas, PIL, matplotlib, skimage, octolyzer.utils, the measurement modules and 
+# the segmentation models are imported lazily within the functions which need them, so 
+# importing this module stays cheap and each code path only pays for what it uses
+
+# Grayscale value of saved artery-vein-optic disc map, indexed by artery | optic disc << 1 | vein << 2
+_AVOD_LUT = np.array([(191*(i & 1) + 255*((i >> 1) & 1) + 127*((i >> 2) & 1)) % 256 for i in range(8)], dtype=np.uint8)
+
+# Numba kernel for optic disc moments, compiled on first use. False if Numba is unavailable
+_OD_MOMENTS_KERNEL = None
+
+# Segmenters instantiated by analyse, loaded at most once per process
+_MODEL_CACHE = {}
+
+
+def _get_model(cls):
+    """
+    Return cached instance of segmenter class cls, instantiating it on first use.
+    """
+    if cls not in _MODEL_CACHE:
+        _MODEL_CACHE[cls] = cls()
+    return _MODEL_CACHE[cls]
+
+
+def _warmup_and_capture(model, dummy):
+    """
+    Warm up a segmenter and capture its forward pass as a CUDA graph, stored on the segmenter
+    and replayed for every subsequent SLO of the same resolution. No-op on CPU or if already captured.
+    """
+    if model.device == 'cpu' or model.cuda_graph is not None:
+        return model
+
+    import torch
+    static_in = dummy.to(model.device)
+    with torch.inference_mode():
+        # Warmup on side stream before capture
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(2):
+                model._forward(static_in)
+        torch.cuda.current_stream().wait_stream(stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph):
+            static_out = model._forward(static_in)
+    model.cuda_graph = (graph, static_in, static_out)
+
+    return model
+
+
+def _od_moments(labels):
+    """
+    Raw integer moments up to second order of the pixels labelled 1.
+    """
+    M, N = labels.shape
+    n = sr = sc = srr = scc = src = 0
+    for i in range(M):
+        for j in range(N):
+            if labels[i, j] == 1:
+                n += 1
+                sr += i
+                sc += j
+                srr += i*i
+                scc += j*j
+                src += i*j
+    return n, sr, sc, srr, scc, src
+
+
+def _get_od_moments_kernel():
+    """
+    Return _od_moments compiled by Numba, importing and compiling it on first use only.
+    Returns False if Numba is not installed.
+    """
+    global _OD_MOMENTS_KERNEL
+    if _OD_MOMENTS_KERNEL is None:
+        try:
+            import numba
+        except ImportError:
+            _OD_MOMENTS_KERNEL = False
+        else:
+            _OD_MOMENTS_KERNEL = numba.njit(cache=True)(_od_moments)
+    return _OD_MOMENTS_KERNEL
+
+
+def _process_opticdisc(od_mask):
+    """
+    Optic disc radius in pixels and boundary, as utils._process_opticdisc, with the radius 
+    computed from the first labelled region's moments by a Numba kernel if available.
+    """
+    kernel = _get_od_moments_kernel()
+    if not kernel:
+        from octolyzer import utils
+        return utils._process_opticdisc(od_mask)
+
+    from skimage import measure, segmentation
+    n, sr, sc, srr, scc, src = kernel(measure.label(od_mask))
+    if n == 0:
+        return None, np.zeros_like(od_mask)
+
+    # Eigenvalues of the region's inertia tensor give its major and minor axis lengths
+    mu_rr = srr/n - (sr/n)**2
+    mu_cc = scc/n - (sc/n)**2
+    mu_rc = src/n - (sr/n)*(sc/n)
+    half_trace = (mu_rr + mu_cc)/2
+    root = np.sqrt(((mu_rr - mu_cc)/2)**2 + mu_rc**2)
+    axis_major_length = 4*np.sqrt(half_trace + root)
+    axis_minor_length = 4*np.sqrt(max(half_trace - root, 0))
+    od_radius = int((axis_minor_length + axis_major_length)/4)
+    od_boundary = segmentation.find_boundaries(od_mask)
+
+    return od_radius, od_boundary
+
+
+def _read_slo(path):
+    """
+    Read an IR-SLO image file as a grayscale uint8 array.
+    """
+    import cv2
+    slo = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+
+    # Fall back to PIL for formats OpenCV cannot decode
+    if slo is None:
+        from PIL import Image, ImageOps
+        slo = np.asarray(ImageOps.grayscale(Image.open(path)))
+
+    return slo
+
+
+def _forward_all(models, inputs):
+    """
+    Run each segmenter's forward pass on its input, each on its own CUDA stream if available.
+    """
+    import torch
+    if inputs[0].is_cuda:
+        preds = []
+        for model, inp in zip(models, inputs):
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                preds.append(model._forward(inp))
+        torch.cuda.synchronize()
+    else:
+        preds = [model._forward(inp) for model, inp in zip(models, inputs)]
+
+    return preds
+
+
+def _validate_args(save_path, scale, save_results, save_images):
+    """
+    Check scale is a sensible microns-per-pixel value, and create save_path if saving.
+
+    Returns the validated save_path, its parent directory, scale, and any messages to log.
+    """
+    messages = []
+    dirpath = None
+
+    # Error handle scale
+    if scale is not None:
+        if not isinstance(scale, (float, int)):
+            messages.append(f"Pixel lengthscale {scale} should be a float or integer. Ignoring scale and measuring in pixels.")
+            scale = None
+        elif (scale > 20) or (scale < 3):
+            messages.append(f"Pixel lengthscale {scale} should be in [3,20] microns-per-pixel. Is your scale in mm-per-pixel?. Ignoring scale and measuring in pixels.")
+            scale = None
+
+    # Error handle save_path
+    if save_results or save_images:
+        if save_path is None:
+            messages.append(f"Path {save_path} is not specified, but option to save is flagged. Creating directory 'output' in current working directory.")
+            save_path = "output"
+            dirpath = save_path
+        else:
+            dirpath = os.path.split(save_path)[0]
+            if not os.path.isdir(save_path):
+                messages.append(f"Path {save_path} does not exist. Creating directory.")
+        os.makedirs(save_path, exist_ok=True)
+
+    return save_path, dirpath, scale, messages
+
+
+def segment_all(slo, slo_model, fov_model, avo_model, location=None):
+    """
+    Segment binary vessels, fovea and artery-vein-optic disc from a single IR-SLO img.
+
+    The SLO is preprocessed and uploaded to the device once, and all three networks are run
+    within a single inference pass (each on its own CUDA stream if available), before their 
+    predictions are post-processed.
+
+    Returns the binary vessel map, (fovea map, fovea) and (artery-vein-optic disc map, optic disc centre).
+    """
+    import torch
+    from PIL import Image, ImageOps
+
+    img_shape = slo.shape
+    img = ImageOps.grayscale(Image.fromarray(slo))
+    x, crop = slo_model.transform(img)
+    x = slo_model._to_device(x.unsqueeze(0))
+
+    # AVOSegmenter is not padded and additionally normalises to [-1, 1]
+    x_avo = (x[..., :crop[0], :crop[1]] - 0.5) / 0.5
+
+    with torch.inference_mode():
+        preds = _forward_all([slo_model, fov_model, avo_model], [x, x, x_avo])
+
+        slo_vbinmap = slo_model._postprocess(preds[0].squeeze(0), img_shape, crop)
+        fov_output = fov_model._postprocess(preds[1].squeeze(0), img_shape, crop)
+        avo_output = avo_model._postprocess(preds[2].squeeze(0), img_shape, location=location)
+
+    return slo_vbinmap, fov_output, avo_output
+
+
+def segment_batch(slos, slo_model, fov_model, avo_model, locations=None, batch_size=8):
+    """
+    Segment binary vessels, fovea and artery-vein-optic disc from a list of IR-SLO imgs.
+
+    SLOs are preprocessed into a preallocated (pinned, if on GPU) buffer and run through each 
+    network batch_size at a time, before each prediction is post-processed serially.
+
+    Returns a list of outputs, one per SLO, of the same form as segment_all.
+    """
+    import torch
+    from PIL import Image, ImageOps
+
+    if locations is None:
+        locations = len(slos)*[None]
+
+    # All SLOs are resized to the (768,768) model resolution, so can be stacked
+    device = slo_model.device
+    x_host = torch.empty((min(batch_size, len(slos)), 1, 768, 768), pin_memory=(device != 'cpu'))
+
+    outputs = []
+    with torch.inference_mode():
+        for i in range(0, len(slos), batch_size):
+            batch = slos[i:i+batch_size]
+            crops = []
+            for j, slo in enumerate(batch):
+                img, crop = slo_model.transform(ImageOps.grayscale(Image.fromarray(slo)))
+                x_host[j] = img
+                crops.append(crop)
+            x = x_host[:len(batch)].to(device, non_blocking=True)
+
+            # AVOSegmenter is not padded and additionally normalises to [-1, 1]
+            x_avo = (x[..., :crops[0][0], :crops[0][1]] - 0.5) / 0.5
+
+            preds = _forward_all([slo_model, fov_model, avo_model], [x, x, x_avo])
+            for j, slo in enumerate(batch):
+                img_shape = slo.shape
+                slo_vbinmap = slo_model._postprocess(preds[0][j], img_shape, crops[j])
+                fov_output = fov_model._postprocess(preds[1][j], img_shape, crops[j])
+                avo_output = avo_model._postprocess(preds[2][j], img_shape, location=locations[i+j])
+                outputs.append((slo_vbinmap, fov_output, avo_output))
+
+    return outputs
+
+
+def analyse_batch(paths, 
+                  save_paths, 
+                  scales=None,
+                  locations=None,
+                  eyes=None,
+                  slo_model=None, 
+                  avo_model=None, 
+                  fov_model=None,
+                  batch_size=8,
+                  **kwargs):
+    """
+    Analyse a list of IR-SLO imgs, segmenting them in batches of batch_size before measuring
+    each image of the batch individually with analyse.
+
+    Inputs:
+    -------------------
+    paths (list) : Paths to image files, or numpy arrays.
+
+    save_paths (list) : Paths to save results of each image to.
+
+    scales, locations, eyes (list) : Per-image scale, location and eye, see analyse. 
+
+    slo_model, avo_model, fov_model : binary, artery-vein-optic disc, and fovea detection models.
+
+    batch_size (int) : Number of images passed through each model at once.
+
+    kwargs : Keyword arguments passed to analyse.
+
+    Returns a list of the outputs of analyse for each image.
+    """
+    from octolyzer.segment.sloseg import slo_inference, avo_inference, fov_inference
+
+    N_imgs = len(paths)
+    paths, save_paths = list(paths), list(save_paths)
+    scales = N_imgs*[None] if scales is None else list(scales)
+    locations = N_imgs*[None] if locations is None else list(locations)
+    eyes = N_imgs*[None] if eyes is None else list(eyes)
+
+    if slo_model is None or type(slo_model) != slo_inference.SLOSegmenter:
+        slo_model = _get_model(slo_inference.SLOSegmenter)
+    if fov_model is None or type(fov_model) != fov_inference.FOVSegmenter:
+        fov_model = _get_model(fov_inference.FOVSegmenter)
+    if avo_model is None or type(avo_model) != avo_inference.AVOSegmenter:
+        avo_model = _get_model(avo_inference.AVOSegmenter)
+
+    # Read, segment and measure one batch at a time, so only a batch of images and
+    # their segmentations are held in memory at once
+    outputs = []
+    for i in range(0, N_imgs, batch_size):
+        batch = slice(i, i+batch_size)
+        slos = [path if isinstance(path, np.ndarray) else _read_slo(path) for path in paths[batch]]
+        predictions = segment_batch(slos, slo_model, fov_model, avo_model, 
+                                    locations=locations[batch], batch_size=batch_size)
+        del slos
+        for path, save_path, scale, location, eye, preds in zip(paths[batch], save_paths[batch], scales[batch], 
+                                                                locations[batch], eyes[batch], predictions):
+            outputs.append(analyse(path, save_path, scale, location, eye, slo_model, avo_model, fov_model, 
+                                   predictions=preds, **kwargs))
+        del predictions
+
+    return outputs
+
 
 def analyse(path, 
             save_path, 
@@ -30,7 +334,8 @@ def analyse(path,
             compute_metrics=True,
             verbose=True,
             segmentation_dict={},
-            demo_return=False):
+            demo_return=False,
+            predictions=None):
     """
     Inner function to analyse an individual IR-SLO img, given options for scaling/location/eye.
 
@@ -59,44 +364,53 @@ def analyse(path,
 
     segmentation_dict (dict) : Dictionaries with new segmentation to recompute measurements. By default left empty UNLESS
                                correcting manual segmentations.
+
+    predictions (tuple) : Output of segment_all for this image, if already segmented, e.g. by analyse_batch.
     """
     # Initialise list of messages to save
     logging_list = []
     metadata = {}
 
+    def log(fmt, *args):
+        """Log message to logging_list, printing if verbose. Only formatted with args if given."""
+        msg = fmt.format(*args) if args else fmt
+        logging_list.append(msg)
+        if verbose:
+            print(msg)
+
     # load image, check to make sure is path
     if isinstance(path, (str, WindowsPath, PosixPath)):
 
         # check if vol file, otherwise is regular image file
         ftype = str(path).split('.')[-1]
         if ftype.lower() == 'vol':
-            slo, meta, log = utils.load_volfile(path, verbose=verbose, logging=[])
+            from octolyzer import utils
+            slo, meta, vol_log = utils.load_volfile(path, verbose=verbose, logging=[])
             eye = meta['eye']
             scale = meta['scale']
             location = meta['location']
-            metadata = copy.deepcopy(meta)
-            logging_list.extend(log)
+            metadata = dict(meta)
+            logging_list.extend(vol_log)
         else:
-            slo = np.array(ImageOps.grayscale(Image.open(path)))
+            slo = _read_slo(path)
 
     # Added for OCTolyzer compatibility
     elif isinstance(path, np.ndarray):
-        slo = path.copy()
+        slo = np.ascontiguousarray(path)
         path = save_path
     else:
-        msg = "Unknown filetype, must be either string/filepath/numpy array."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
+        log("Unknown filetype, must be either string/filepath/numpy array.")
         return
     img_shape = slo.shape
     _, N = img_shape
 
     # Collect metadata for recomputing measurements when a manual annotation is provided
     segmented_already = False
+    _od_processed = False
     if 'metadata' in segmentation_dict:
         segmented_already = True
-        slo_metadata = copy.deepcopy(segmentation_dict['metadata'])
+        from octolyzer.segment.sloseg import avo_inference
+        slo_metadata = dict(segmentation_dict['metadata'])
         fovea = np.array([slo_metadata['slo_fovea_x'], slo_metadata['slo_fovea_y']]).astype(int)
         
         # Extract segmentation masks, recompute OD centre and OD radius
@@ -106,7 +420,8 @@ def analyse(path,
         od_mask = slo_avimout[...,1]
         od_centre = avo_inference._get_od_centre(od_mask)
         if slo_metadata['location'] == 'peripapillary':
-            od_radius, od_boundary = utils._process_opticdisc(od_mask)
+            od_radius, od_boundary = _process_opticdisc(od_mask)
+            _od_processed = True
             metadata['optic_disc_x'] = od_centre[0]
             metadata['optic_disc_y'] = od_centre[1]
             metadata['optic_disc_radius_px'] = od_radius
@@ -117,121 +432,69 @@ def analyse(path,
     fname_type = os.path.split(save_path)[1]
     fname = fname_type.split(".")[0]
     metadata['Filename'] = fname_type
-    msg = f"\n\nANALYSING SLO of {fname}."
-    logging_list.append(msg)
-    if verbose:
-        print(msg)
+    log("\n\nANALYSING SLO of {}.", fname)
 
-    # Error handle scale
-    if scale is not None:
-        if not isinstance(scale, (float, int)):
-            msg = f"Pixel lengthscale {scale} should be a float or integer. Ignoring scale and measuring in pixels."
-            logging_list.append(msg)
-            if verbose:
-                print(msg)
-            scale = None
-        if (scale > 20) or (scale < 3):
-            msg = f"Pixel lengthscale {scale} should be in [3,20] microns-per-pixel. Is your scale in mm-per-pixel?. Ignoring scale and measuring in pixels."
-            logging_list.append(msg)
-            if verbose:
-                print(msg)
-            scale = None
-
-    
-    # Error handle save_path
-    if (save_results+save_images)>0:
-        if save_path is None:
-            msg = f"Path {save_path} is not specified, but option to save is flagged. Creating directory 'output' in current working directory."
-            logging_list.append(msg)
-            if verbose:
-                print(msg)
-            save_path = "output"
-            dirpath = save_path
-            os.mkdir(save_path)
-              
-        else: 
-            dirpath = os.path.split(save_path)[0]
-            if not os.path.exists(dirpath):
-                os.mkdir(dirpath)
-            if not os.path.exists(save_path):
-                msg = f"Path {save_path} does not exist. Creating directory."
-                logging_list.append(msg)
-                if verbose:
-                    print(msg)
-                os.mkdir(save_path)
+    # Error handle scale and save_path
+    save_path, dirpath, scale, messages = _validate_args(save_path, scale, save_results, save_images)
+    for msg in messages:
+        log(msg)
 
     # Save out SLO image
     if slo.max() == 1:
         slo_save = (255*slo).astype(np.uint8)
     else:
-        slo_save = slo.copy()
+        slo_save = slo
     if save_images:
+        import cv2
         cv2.imwrite(os.path.join(save_path,f"{fname}_slo.png"), slo_save)
 
     # SEGMENTING
     if not segmented_already:
+        import cv2
         segmentations = []
-        msg = "\nSEGMENTING..."
-        
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
+        log("\nSEGMENTING...")
+
+        if predictions is None:
+            import torch
+            from octolyzer.segment.sloseg import slo_inference, avo_inference, fov_inference
     
-        # Forcing model instantiation if unspecified
-        # SLO segmentation models
-        if slo_model is None or type(slo_model) != slo_inference.SLOSegmenter:
-            msg = "Loading models..."
-            logging_list.append(msg)
-            if verbose:
-                print(msg)
-            slo_model = slo_inference.SLOSegmenter()
-         # SLO segmentation models
-        if fov_model is None or type(fov_model) != fov_inference.FOVSegmenter:
-            fov_model = fov_inference.FOVSegmenter()
-        # AVO segmentation models
-        if avo_model is None or type(avo_model) == avo_inference.AVOSegmenter:
-            avo_model = avo_inference.AVOSegmenter()
-
-        # binary vessel detection
-        msg = "    Segmenting binary vessels from SLO image."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
-        slo_vbinmap = slo_model.predict_img(slo)
+            # Forcing model instantiation if unspecified
+            # SLO segmentation models
+            if slo_model is None or type(slo_model) != slo_inference.SLOSegmenter:
+                log("Loading models...")
+                slo_model = _get_model(slo_inference.SLOSegmenter)
+             # SLO segmentation models
+            if fov_model is None or type(fov_model) != fov_inference.FOVSegmenter:
+                fov_model = _get_model(fov_inference.FOVSegmenter)
+            # AVO segmentation models
+            if avo_model is None or type(avo_model) != avo_inference.AVOSegmenter:
+                avo_model = _get_model(avo_inference.AVOSegmenter)
+
+            # Capture each segmenter as a CUDA graph at the fixed (768,768) model resolution
+            dummy = torch.zeros((1,1,768,768))
+            for model in [slo_model, fov_model, avo_model]:
+                _warmup_and_capture(model, dummy)
+
+            # binary vessel, fovea and artery-vein-optic disc detection, run together 
+            # in a single inference pass
+            log("    Segmenting binary vessels, fovea, artery-vein vessels and optic disc from SLO image.")
+            slo_vbinmap, (fmask, fovea), (slo_avimout, od_centre) = segment_all(slo, slo_model, fov_model, 
+                                                                                avo_model, location=location)
+        else:
+            slo_vbinmap, (fmask, fovea), (slo_avimout, od_centre) = predictions
         segmentations.append(slo_vbinmap)
-
-        # fovea detection
-        msg = "    Segmenting fovea from SLO image."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
-        fmask, fovea = fov_model.predict_img(slo)
         if save_images:
             fpred = 255*(fmask > 0.5).astype(np.uint8)
             cv2.imwrite(os.path.join(save_path,f"{fname}_slo_fovea_map.png"), fpred)
         segmentations.append(fmask)
-
-        # artery-vein-optic disc detection, using binary vessel detector as original reference
-        # We also reassigh the binary vessel map as artery+vein maps
-        msg = "    Segmenting artery-vein vessels and optic disc from SLO image."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
-        slo_avimout, od_centre = avo_model.predict_img(slo, location=location)#, slo_vbinmap)
         if od_centre is None:
-            msg = 'WARNING: Optic disc not detected. Please check image.'
-            logging_list.append(msg)
-            if verbose:
-                print(msg)
+            log('WARNING: Optic disc not detected. Please check image.')
         od_mask = slo_avimout[...,1]
         segmentations.append(slo_avimout)
         
 
     # Attempt to resolve location if not inputted
-    msg = "\nInferring image metadata..."
-    logging_list.append(msg)
-    if verbose:
-        print(msg)
+    log("\nInferring image metadata...")
     metadata["location"] = location
     if location is None:
         
@@ -241,16 +504,10 @@ def analyse(path,
         if od_centre is not None:
             if 0.1*img_shape[1] < od_centre[0] < 0.9*img_shape[1]:
                 location = "Optic disc"
-        msg = f"    No location specified. Detected SLO image to be {location.lower()}-centred."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
+        log("    No location specified. Detected SLO image to be {}-centred.", location.lower())
         metadata["location"] = location
     else:
-        msg = f"    Location is specified as {location.lower()}-centred."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
+        log("    Location is specified as {}-centred.", location.lower())
             
     # If eye unspecified, try to infer
     if eye is None:
@@ -291,16 +548,11 @@ def analyse(path,
             else:
                 eye = 'Right'
             msg += f" Thus, the SLO image is assumed as the {eye} eye. Please check."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)   
+        log(msg)
     
     # Eye provided in the metadata
     else:
-        msg = f"    Eye type is specified as the {eye} eye."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
+        log("    Eye type is specified as the {} eye.", eye)
     metadata["eye"] = eye
     metadata['manual_annotation'] = segmented_already
 
@@ -309,23 +561,22 @@ def analyse(path,
     if fovea.sum() == 0:
         # alert user that fovea is missing
         fovea_missing = True
-        msg = "Fovea was not detected. Please double-check image."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)  
+        log("Fovea was not detected. Please double-check image.")
     metadata["slo_fovea_x"] = fovea[0]
     metadata["slo_fovea_y"] = fovea[1]
     metadata["slo_missing_fovea"] = fovea_missing
 
     # store optic disc centre,
     # The latter is only stored for for an optic disc-centred scan
-    # macular-centred SLO do not show the optic disc entirely
-    od_radius, od_boundary = utils._process_opticdisc(od_mask)
+    # macular-centred SLO do not show the optic disc entirely, so we skip
+    # processing the optic disc, and only process it once otherwise
+    if location == 'Macula':
+        od_radius = None
+    elif not _od_processed:
+        od_radius, od_boundary = _process_opticdisc(od_mask)
     if location == "Optic disc":
         metadata["optic_disc_x"] = od_centre[0]
         metadata["optic_disc_y"] = od_centre[1]
-    elif location == 'Macula':
-        od_radius = None
     metadata["optic_disc_radius_px"] = od_radius
     metadata["scale"] = scale
     if scale is None:
@@ -333,10 +584,7 @@ def analyse(path,
     else:
         metadata["measurement_units"] = "microns"
         metadata["scale_units"] = "microns-per-pixel"
-    msg = f"Measurements which have units are in {metadata['measurement_units']} units. Otherwise they are non-dimensional."
-    logging_list.append(msg)
-    if verbose:
-        print(msg)
+    log("Measurements which have units are in {} units. Otherwise they are non-dimensional.", metadata['measurement_units'])
 
     # Binary vessels are:
     #        pixels detected by the binary vessel detector
@@ -345,23 +593,30 @@ def analyse(path,
     # We purposely choose not to fill in any missing AV-pixels using the binary vessel detector as this
     # can lead to many missclassified pixels due to the AV-model's uncertainty.
     # Therefore, the binary vessel map will ALWAYS contain more pixels detected.
-    slo_vbinmap = (((slo_vbinmap + (slo_avimout[...,[0,2]].sum(axis=-1) > 0)).astype(bool)) * (1-od_mask)).astype(int)
+    artery_vbinmap, vein_vbinmap = slo_avimout[...,0], slo_avimout[...,2]
+    slo_vbinmap = np.logical_or(slo_vbinmap, artery_vbinmap)
+    np.logical_or(slo_vbinmap, vein_vbinmap, out=slo_vbinmap)
+    np.logical_and(slo_vbinmap, od_mask == 0, out=slo_vbinmap)
+    slo_vbinmap = slo_vbinmap.view(np.uint8)
     segmentations[0] = slo_vbinmap
 
     # option to save out segmentation masks
     if save_images:
-        avoimout_save = 191*slo_avimout[...,0] + 127*slo_avimout[...,2] + 255*slo_avimout[...,1]
+        from PIL import Image
+        avod_idx = slo_avimout[...,0].astype(np.uint8)
+        avod_idx |= slo_avimout[...,1].astype(np.uint8) << 1
+        avod_idx |= slo_avimout[...,2].astype(np.uint8) << 2
+        avoimout_save = _AVOD_LUT[avod_idx]
         Image.fromarray((255*slo_vbinmap).astype(np.uint8)).save(os.path.join(save_path,f"{fname}_slo_binary_map.png"))
-        Image.fromarray((avoimout_save).astype(np.uint8)).save(os.path.join(save_path,f"{fname}_slo_avod_map.png"))
+        Image.fromarray(avoimout_save).save(os.path.join(save_path,f"{fname}_slo_avod_map.png"))
 
     # FEATURE MEASUREMENTS
     # - macula-centred SLO: 8mm square ROI if scale specified, otherwise whole image
     # - optic disc-centred SLO: Zone B and C (0.5-1, 0.5-2 annulus) around optic disc, and whole image
-    msg = "\nFEATURE MEASUREMENT..."
-    logging_list.append(msg)
-    if verbose:
-        print(msg)
+    import pandas as pd
+    log("\nFEATURE MEASUREMENT...")
     if compute_metrics:
+        from octolyzer.measure.slo import slo_measurement
         slo_dict = {}
         slo_keys = ["binary", "artery", "vein"]
 
@@ -389,26 +644,17 @@ def analyse(path,
         msg += " using the whole image. This may lead to non-standardised measurements across a population."
         # else:
            # msg += postfix_msg + f" using a {macula_r[-1]}mm, {rois[-1]}-shaped ROI."
-        logging_list.append(msg)
-        if verbose:
-            print(msg)
+        log(msg)
 
         if location == 'Optic disc':
-            msg = "We will also measure Zones B (0.5-1 OD diameter) and C (2 OD diameter) from optic disc margin."
-            logging_list.append(msg)
-            if verbose:
-                print(msg)
+            log("We will also measure Zones B (0.5-1 OD diameter) and C (2 OD diameter) from optic disc margin.")
 
         # Loop over vessel maps to measure
-        artery_vbinmap, vein_vbinmap = slo_avimout[...,0], slo_avimout[...,2]
         for v_map, v_type in zip([slo_vbinmap, artery_vbinmap, vein_vbinmap], slo_keys):
                 
             # log to user 
             slo_dict[v_type] = {}
-            msg = f"    Measuring {v_type} SLO vessel map"
-            logging_list.append(msg)
-            if verbose:
-                print(msg)
+            log("    Measuring {} SLO vessel map", v_type)
             masks = []
             #mask_rois = []
 
@@ -416,10 +662,7 @@ def analyse(path,
             for (grid, r) in zip(rois, macula_r):
 
                 if location == 'Optic disc':
-                    msg = f"        Using zone {grid} ROI" if grid in ["B", "C"] else f"        Using {grid} ROI"
-                    logging_list.append(msg)
-                    if verbose:
-                        print(msg)
+                    log("        Using zone {} ROI" if grid in ["B", "C"] else "        Using {} ROI", grid)
 
                 # For debugging
                 if demo_return and grid == 'C':
@@ -444,6 +687,9 @@ def analyse(path,
 
         # Plot the segmentations superimposed onto the SLO
         if save_images or collate_segmentations:
+            import matplotlib.pyplot as plt
+            from skimage import segmentation, morphology
+            from octolyzer import utils
             
             # binary vessel mask - purple
             slo_vcmap = utils.generate_imgmask(slo_vbinmap, None, 1)
@@ -455,6 +701,8 @@ def analyse(path,
             slo_av_cmap[...,1] = 0
             stacked_cmap = np.hstack([np.zeros_like(slo_vcmap), slo_vcmap, slo_av_cmap])
             if od_mask.sum() != 0:
+                # avo_inference is not imported when predictions were precomputed
+                from octolyzer.segment.sloseg import avo_inference
                 od_coords = avo_inference._fit_ellipse((255*od_mask).astype(np.uint8), get_contours=True)[:,0]
                 od_coords = od_coords[(od_coords[:,0] > 0) & (od_coords[:,0] < N-1)]
                 od_coords = od_coords[(od_coords[:,1] > 0) & (od_coords[:,1] < N-1)]
@@ -508,30 +756,21 @@ def analyse(path,
                 fig.savefig(os.path.join(save_path, f"{fname}_superimposed.png"), bbox_inches="tight")
             if collate_segmentations:
                 segmentation_directory = os.path.join(dirpath, "slo_segmentations")
-                if not os.path.exists(segmentation_directory):
-                    os.mkdir(segmentation_directory)
+                os.makedirs(segmentation_directory, exist_ok=True)
                 fig.savefig(os.path.join(segmentation_directory, f"{fname}.png"), bbox_inches="tight")
             plt.close()
 
         # Organise measurements of SLO into dataframe
-        slo_df = utils.nested_dict_to_df(slo_dict).reset_index()
-        slo_df = slo_df.rename({"level_0":"vessel_map", "level_1":"zone"}, axis=1, inplace=False)
         reorder_cols = ["vessel_map", "zone", "fractal_dimension", "vessel_density", "average_global_calibre", 
                         "average_local_calibre", "tortuosity_density", "CRAE_Knudtson", "CRVE_Knudtson"]
-        slo_df = slo_df[reorder_cols]
+        records = [{"vessel_map":v_type, "zone":zone, **metrics, "AVR":-1} 
+                   for v_type, zone_dict in slo_dict.items() for zone, metrics in zone_dict.items()]
 
         # Compute AVR
-        slo_df["AVR"] = -1
-        all_grids = np.array(list(slo_df.zone.drop_duplicates()))
-        avrs = []
-        for z in all_grids:
-            crae = slo_df[(slo_df.zone==z) & (slo_df.vessel_map=="artery")].iloc[0].CRAE_Knudtson
-            crve = slo_df[(slo_df.zone==z) & (slo_df.vessel_map=="vein")].iloc[0].CRVE_Knudtson
-            if crae==-1 or crve ==-1:
-                avrs.append(-1)
-            else:
-                avrs.append(crae/crve)
-        avrs = np.array(avrs)
+        all_grids = np.array(list(slo_dict["artery"].keys()), dtype=object)
+        craes = np.array([slo_dict["artery"][zone]["CRAE_Knudtson"] for zone in all_grids], dtype=float)
+        crves = np.array([slo_dict["vein"][zone]["CRVE_Knudtson"] for zone in all_grids], dtype=float)
+        avrs = np.where((craes == -1) | (crves == -1), -1, craes / crves)
 
         # Outputting warning to user if AVR exceeds 1
         warning_zones = all_grids[avrs > 1]
@@ -543,29 +782,21 @@ def analyse(path,
                 for z in warning_zones[:-1]:
                     msg += f"{z}, "
                 msg += f"and {warning_zones[-1]}. Please check artery-vein segmentation."
-            if verbose:
-                print(msg)
-        logging_list.append(msg)
+            log(msg)
 
-        # add AVR to measurement dataframe
-        null_dict = {key:len(all_grids)*[-1] for key in reorder_cols[2:]}
-        avr_dict = {**{"vessel_map":len(all_grids)*["artery-vein"], "zone":all_grids},**null_dict, **{"AVR":avrs}}
-        avr_df = pd.DataFrame(avr_dict)
-        slo_df = pd.concat([slo_df, avr_df], axis=0).reset_index(drop=True)
+        # add AVR to measurements and construct dataframe once
+        null_dict = {key:-1 for key in reorder_cols[2:]}
+        records.extend({"vessel_map":"artery-vein", "zone":zone, **null_dict, "AVR":avr} 
+                       for zone, avr in zip(all_grids, avrs))
+        slo_df = pd.DataFrame.from_records(records, columns=reorder_cols+["AVR"])
+        slo_df = slo_df.astype({col:float for col in reorder_cols[2:]+["AVR"]})
 
         # Collect dataframes per zone
         slo_df.loc[slo_df.zone.isin(["B", "C"]), ["fractal_dimension", "vessel_density", "average_global_calibre"]] = -1
-        slo_dfs = []
-        for z in all_grids:
-            df = slo_df[slo_df.zone == z].reset_index(drop=True)
-            df = df.iloc[[1,0,2,3]].reset_index(drop=True)
-            slo_dfs.append(df)
+        slo_dfs = [df.reset_index(drop=True) for _, df in slo_df.groupby("zone", sort=False)]
         
     else:
-        msg = f"Skipping metric calculation as analyse_slo_flag is 0."
-        if verbose:
-            print(msg)
-        logging_list.append(msg)
+        log("Skipping metric calculation as analyse_slo_flag is 0.")
         slo_dfs = [pd.DataFrame()]
 
     # Save out measurements and segmentations
@@ -1,42 +1,88 @@
 import logging
 import os
+import functools
 import numpy as np
 import sys
 import math
 import matplotlib.pyplot as plt
-import seaborn as sns
 import skimage.feature as feature
 import skimage.measure as meas 
 import skimage.transform as trans
 import skimage.morphology as morph
 from skimage import segmentation
-from scipy import interpolate
-from skimage import draw
-from sklearn.linear_model import LinearRegression
+from scipy import ndimage
 from octolyzer.measure.bscan.thickness_maps.utils import (extract_bounds, interp_trace, 
-                                                                smart_crop, generate_imgmask)
+                                                                smart_crop)
 from octolyzer.measure.bscan import utils as bscan_utils
 import matplotlib.ticker as ticker
-import pandas as pd
 from octolyzer import utils
 import matplotlib
+from matplotlib.colors import ListedColormap
+
+# Footprint used to thicken grid boundaries for plotting, and colour maps drawing
+# overlays as opaque red (grid) and green (acquisition circle) on transparent
+_DILATE_FOOTPRINT = morph.disk(radius=2).astype(bool)
+_BOUNDS_CMAP = ListedColormap([(0,0,0,0), (1,0,0,1)])
+_PERIPAPILLARY_CMAP = ListedColormap([(0,0,0,0), (1,0,0,1), (0,1,0,1)])
+
+# Peripapillary sector cutoffs, sector label locations and names for thickness profile axes
+_GRID_CUTOFFS = np.array([0, 45, 90, 135, 225, 270, 315, 360]) - 180
+_XAXIS_LOCS = np.array([22.5, 67.5, 112.5, 180, 247.5, 292.5, 337.5]) - 180
+_RNFL_LOCS = ("Nasal", "Infero Nasal", "Infero Temporal", "Temporal", 
+              "Supero Temporal", "Supero Nasal", "Nasal")
+_PROFILE_XTICKS = tuple(_GRID_CUTOFFS[:4]) + (0,) + tuple(_GRID_CUTOFFS[4:])
+_PROFILE_XTICKLABELS = tuple(np.abs(_GRID_CUTOFFS[:4])) + (0,) + tuple(_GRID_CUTOFFS[4:])
+_GRID_CUTOFFS.flags.writeable = False
+_XAXIS_LOCS.flags.writeable = False
+
+# Peripapillary grid measurements in the order their values are annotated
+_PERIPAPILLARY_KEYS = ('temporal_[um]','supero_temporal_[um]','supero_nasal_[um]',
+                       'nasal_[um]','infero_nasal_[um]','infero_temporal_[um]', 'All_[um]',
+                       'PMB_[um]', 'N/T')
+
+
+def _split_by_line(ys, xs, m, c, left_mask, right_mask):
+    """
+    Given pixel coordinates (ys, xs), set those on or above the line y = m*x + c
+    in right_mask and the remainder in left_mask.
+    """
+    line_y = np.multiply(xs, m, dtype=np.float64)
+    line_y += c
+    above = ys <= line_y
+    right_mask[ys[above], xs[above]] = True
+    left_mask[ys[~above], xs[~above]] = True
 
 
 def rotate_point(point, origin, angle):
     """
-    Rotate a point counterclockwise by a given angle around a given origin.
+    Rotate a point, or an array of points of shape (N, 2), counterclockwise by a 
+    given angle around a given origin.
 
     The angle should be given in radians.
     """
     ox, oy = origin
-    px, py = point
+    px, py = np.moveaxis(np.asarray(point), -1, 0)
+    cos, sin = math.cos(angle), math.sin(angle)
+    dx, dy = px - ox, py - oy
 
-    qx = ox + math.cos(angle) * (px - ox) - math.sin(angle) * (py - oy)
-    qy = oy + math.sin(angle) * (px - ox) + math.cos(angle) * (py - oy)
+    qx = ox + cos * dx - sin * dy
+    qy = oy + sin * dx + cos * dy
     return qx, qy
 
 
 
+def _squared_distance_map(img_shape, center):
+    """
+    Squared distance of every pixel from center, given as (x, y).
+    """
+    h, w = img_shape
+    Y, X = np.ogrid[:h, :w]
+    dx = X - center[0]
+    dy = Y - center[1]
+    return dx*dx + dy*dy
+
+
+
 def create_circular_mask(img_shape=(768,768), center=None, radius=None):
     """
     Given a center, radius and image shape, draw a filled circle
@@ -49,10 +95,8 @@ def create_circular_mask(img_shape=(768,768), center=None, radius=None):
     if radius is None: # use the smallest distance between the center and image walls
         radius = min(center[0], center[1], w-center[0], h-center[1])
 
-    Y, X = np.ogrid[:h, :w]
-    dist_from_center = np.sqrt((X - center[0])**2 + (Y-center[1])**2)
-
-    mask = dist_from_center <= radius
+    # Compare squared distance to squared radius, avoiding a full-image sqrt
+    mask = _squared_distance_map(img_shape, center) <= radius*radius
     return mask
 
 
@@ -86,26 +130,24 @@ def create_circular_grids(circle_mask, angle=0):
     topbot_idx = np.ma.masked_where((all_angles < 45-angle) & (all_angles > -45-angle), 
                                       np.arange(circ_idx.shape[0])).mask
 
-    # Generate superior-inferior and temporal-nasal subregions of circular mask
-    top_bot = np.zeros_like(circle_mask)
-    topbot_circidx = circ_idx[topbot_idx].copy()
-    top_bot[topbot_circidx[:,0], topbot_circidx[:,1]] = 1
-    right_left = np.zeros_like(circle_mask)
-    rightleft_circidx = circ_idx[~topbot_idx].copy()
-    right_left[rightleft_circidx[:,0], rightleft_circidx[:,1]] = 1
-
     # Split superior-inferior and temporal-nasal into quadrants
-    topbot_split = np.concatenate(2*[np.zeros_like(circle_mask)[np.newaxis]]).astype(int)
-    rightleft_split = np.concatenate(2*[np.zeros_like(circle_mask)[np.newaxis]]).astype(int)
-
-    # Split two quadrants up - they're connected by a single pixel so 
-    # temporarily remove and then replace
-    top_bot[c_y, c_x] = 0
-    topbot_props = meas.regionprops(meas.label(top_bot))  
-    leftright_props = meas.regionprops(meas.label(right_left))  
-    for i,(reg_tb, reg_rl) in enumerate(zip(topbot_props, leftright_props)):
-        topbot_split[i, reg_tb.coords[:,0], reg_tb.coords[:,1]] = 1
-        rightleft_split[i, reg_rl.coords[:,0], reg_rl.coords[:,1]] = 1
+    topbot_split = np.zeros((2, *output_shape), dtype=bool)
+    rightleft_split = np.zeros((2, *output_shape), dtype=bool)
+
+    # Superior-inferior quadrants lie either side of the centre row, and temporal-nasal either side
+    # of the centre column (they only meet at the centre pixel), so split their coordinates directly
+    # rather than labelling connected components. Each pair is ordered by its first pixel in raster 
+    # order, as they would be labelled
+    topbot_circidx = circ_idx[topbot_idx]
+    rightleft_circidx = circ_idx[~topbot_idx]
+    topbot_quads = [topbot_circidx[topbot_circidx[:,0] < c_y], topbot_circidx[topbot_circidx[:,0] > c_y]]
+    rightleft_quads = [rightleft_circidx[rightleft_circidx[:,1] < c_x], rightleft_circidx[rightleft_circidx[:,1] > c_x]]
+    raster_order = lambda quad: quad[0,0]*N + quad[0,1] if quad.shape[0] > 0 else np.inf
+    topbot_quads.sort(key=raster_order)
+    rightleft_quads.sort(key=raster_order)
+    for i,(quad_tb, quad_rl) in enumerate(zip(topbot_quads, rightleft_quads)):
+        topbot_split[i, quad_tb[:,0], quad_tb[:,1]] = 1
+        rightleft_split[i, quad_rl[:,0], quad_rl[:,1]] = 1
     topbot_split[0][c_y, c_x] = 1
 
     # Order quadrants consistently dependent on angle
@@ -133,60 +175,57 @@ def create_circular_grids(circle_mask, angle=0):
 
 def create_peripapillary_grid(radius, centre, img_shape=(768,768), angle=0, eye='Right'):
     '''
-    Create peripapillary average thickness profile grid
+    Create peripapillary average thickness profile grid.
+
+    Grids are cached by their geometry, as batches of scans often share it, 
+    so the returned masks are read-only.
+    '''
+    centre = tuple(np.asarray(centre).tolist())
+    return list(_create_peripapillary_grid(radius, centre, tuple(img_shape), angle, eye))
+
+
+
+@functools.lru_cache(maxsize=8)
+def _create_peripapillary_grid(radius, centre, img_shape, angle, eye):
+    '''
+    Cached implementation of create_peripapillary_grid, with hashable arguments.
     '''
     angle += 1e-8
-    circle_mask = create_circular_mask(img_shape, centre, radius).astype(int)
-    centre_mask = create_circular_mask(img_shape, centre, int(radius//3)).astype(int)
-    N, M = img_shape
+    circle_mask = create_circular_mask(img_shape, centre, radius)
+    centre_mask = create_circular_mask(img_shape, centre, int(radius//3))
     circ_4grids = create_circular_grids(circle_mask, angle)
     
     grid_masks = []
     for idx, quad in enumerate(circ_4grids):
         # Don't split temporal and nasal quadrant
         if idx in [1, 3]:
-            grid_masks.append(quad * (1-centre_mask))
+            grid_masks.append(quad & ~centre_mask)
 
         # For superior and inferior quadrants, split in half lengthways
         else:
-            # Generate line between centroid and centre of circle
-            centroid = meas.centroid(quad)[[1,0]]
+            # Generate line between centroid and centre of circle, taking the
+            # centroid from the quadrant's pixel coordinates
+            reg_coords = meas.regionprops(meas.label(quad))[0].coords
+            centroid = reg_coords.mean(axis=0)[[1,0]]
             m, c = bscan_utils.construct_line(centroid, centre)
-            x_grid = np.arange(0, N)
-            y_grid = m*x_grid+c
-            x_grid = x_grid[(y_grid > 0) & (y_grid < N)].astype(int)
-            y_grid = y_grid[(y_grid > 0) & (y_grid < N)].astype(int)
 
-            # Loop over quadrant pixel coordinate and store which is below/above
-            reg_coords = meas.regionprops(meas.label(quad))[0].coords
-            left = []
-            right = []
+            # Split quadrant pixel coordinates by which side of the line they lie
             left_mask = np.zeros_like(circle_mask)
             right_mask = np.zeros_like(circle_mask)
-            for (y,x) in reg_coords:
-                if y <= m*x + c:
-                    right.append([x,y])
-                else:
-                    left.append([x,y])
-            right = np.array(right)
-            left = np.array(left)
-            left_mask[(left[:,1], left[:,0])] = 1
-            right_mask[(right[:,1], right[:,0])] = 1
-            if idx == 0:
-                grid_masks.append(left_mask.astype(int) * (1-centre_mask))
-                grid_masks.append(right_mask.astype(int) * (1-centre_mask))
-            else: 
-                grid_masks.append(left_mask.astype(int) * (1-centre_mask))
-                grid_masks.append(right_mask.astype(int) * (1-centre_mask))
+            _split_by_line(reg_coords[:,0], reg_coords[:,1], m, c, left_mask, right_mask)
+            grid_masks.append(left_mask & ~centre_mask)
+            grid_masks.append(right_mask & ~centre_mask)
 
     # Order according to eye type, so it's always temporal -> supero-temporal -> ... -> infero-temporal
     grid_masks.append(centre_mask)
     if eye == 'Right':
-        grid_masks = np.array(grid_masks)[[2,1,0,5,3,4,6]]
+        grid_masks = [grid_masks[i] for i in [2,1,0,5,3,4,6]]
     elif eye == 'Left':
-        grid_masks = np.array(grid_masks)[[5,0,1,2,4,3,6]]
+        grid_masks = [grid_masks[i] for i in [5,0,1,2,4,3,6]]
+    for mask in grid_masks:
+        mask.flags.writeable = False
 
-    return grid_masks
+    return tuple(grid_masks)
 
 
 
@@ -200,16 +239,17 @@ def create_etdrs_grid(scale=11.49, center=(384,384), img_shape=(768,768),
     # Standard diameter measureents of ETDRS study grid.
     etdrs_radii = [int(np.ceil((N/scale)/2)) for N in etdrs_microns]
 
-    # Draw circles and quadrants
-    circles = [create_circular_mask(img_shape, center, radius=r) for r in etdrs_radii]
+    # Draw circles from a single squared distance map, and quadrants
+    dist_sq = _squared_distance_map(img_shape, center)
+    circles = [dist_sq <= r*r for r in etdrs_radii]
     quadrants = [create_circular_grids(circle, angle) for circle in circles[1:]]
 
     # Subtract different sized masks to get individual binary masks of ETDRS study grid
     central = circles[0]
-    inner_regions = [(q-central).clip(0,1) for q in quadrants[0]]
-    inner_circle = np.sum(np.array(inner_regions), axis=0).clip(0,1)
-    outer_regions = [(q-inner-central).clip(0,1) for (q,inner) in zip(quadrants[1],inner_regions)]
-    outer_circle = np.sum(np.array(outer_regions), axis=0).clip(0,1)
+    inner_regions = [q & ~central for q in quadrants[0]]
+    inner_circle = np.logical_or.reduce(inner_regions)
+    outer_regions = [q & ~inner & ~central for (q,inner) in zip(quadrants[1],inner_regions)]
+    outer_circle = np.logical_or.reduce(outer_regions)
 
     return (circles, quadrants), (central, inner_circle, outer_circle), (inner_regions, outer_regions)
 
@@ -253,56 +293,78 @@ def create_square_grid(scalex=11.48, center=None, img_shape=(768,768), angle=0,
     grid_masks = []
     labels = []
     if angle == 0:
-        # Create square mask
-        rr,cc = draw.rectangle(start=(box_idx_lr[0], box_idx_ud[0]), extent=width)
-        all_mask = np.zeros(img_shape)
-        all_mask[rr,cc] = 1
-
-        # Split square into cells 
+        # Split square into cells, slicing each into one zeroed block of cell masks
+        cells = np.zeros((N_grid*N_grid, *img_shape), dtype=bool)
         for i,(x1,x2) in enumerate(zip(box_idx_lr[:-1],box_idx_lr[1:])):
             for j,(y1,y2) in enumerate(zip(box_idx_ud[:-1], box_idx_ud[1:])):
-                grid = all_mask.copy()
-                grid[x1:x2, y1:y2] = 2
-                grid_masks.append(grid-all_mask)
+                grid = cells[i*N_grid + j]
+                grid[x1:x2, y1:y2] = True
+                grid_masks.append(grid)
                 labels.append((i,j))
     else:
-        grid_xy = np.swapaxes(np.transpose(np.array(np.meshgrid(box_idx_lr, box_idx_ud))), 0, 1).reshape(-1,2)
-        gridxy_rotate = np.array([rotate_point(xy, center, (angle*np.pi/180)) for xy in grid_xy]).astype(int)
-        gridxy_rotate = gridxy_rotate.reshape(N_grid+1, N_grid+1, 2)
+        # Rotate every pixel back into the unrotated grid's frame (pixel rows are y, columns x) 
+        # and look up which cell it falls in, labelling the image once rather than rasterising
+        # each cell's polygon over the whole image
+        Y, X = np.ogrid[:h, :w]
+        u, v = rotate_point(np.stack(np.broadcast_arrays(X, Y), axis=-1), center, -(angle*np.pi/180))
+        cell_j = np.searchsorted(box_idx_lr, u, side="right") - 1
+        cell_i = np.searchsorted(box_idx_ud, v, side="right") - 1
+        in_grid = (cell_i >= 0) & (cell_i < N_grid) & (cell_j >= 0) & (cell_j < N_grid)
+        labels2d = np.where(in_grid, cell_i*N_grid + cell_j, -1)
 
         for i in range(N_grid):
             for j in range(N_grid):
-                arr = np.array([gridxy_rotate[[i,i+1],j], gridxy_rotate[[i,i+1],j+1]]).reshape(-1,2)[:,[1,0]]
-                grid = draw.polygon2mask(polygon=arr[[2,3,1,0]], image_shape=img_shape)
-                grid_masks.append(grid)
+                grid_masks.append(labels2d == i*N_grid + j)
                 labels.append((i,j))
 
     return grid_masks, labels, logging
 
 
 
+def _grid_labels(masks):
+    """
+    Label image of (disjoint) grid masks, numbered from 1 in order with background 0, 
+    using the smallest integer type that holds every label.
+    """
+    label_img = np.zeros(masks[0].shape, dtype=np.min_scalar_type(len(masks)))
+    for i, mask in enumerate(masks, 1):
+        label_img[mask.astype(bool, copy=False)] = i
+    return label_img
+
+
+
+def _grid_centroids(label_img, n_masks):
+    """
+    Centroids of all labelled grid masks in (x, y) order, found in one pass over the label image.
+    """
+    cy_cx = ndimage.center_of_mass(label_img > 0, label_img, index=np.arange(1, n_masks+1))
+    return list(np.array(cy_cx)[:,[1,0]])
+
+
+
+def _grid_boundaries(label_img):
+    """
+    Boundaries of all labelled grid masks, found in one pass over the label image.
+    """
+    return segmentation.find_boundaries(label_img, mode="thick")
+
+
+
 def interp_missing(ctmask, mode="nearest"):
     """
     Nearest neighbour interpolation of CT map if missing values
     in one of the ETDRS study grids
     """
-    # Detect where values to be interpolated, values 
-    # with known CT measurements, and values outside subregion
-    ctmap_nanmask = np.isnan(ctmask)
+    # Detect values with known CT measurements, and values outside subregion
     ctmap_ctmask = ctmask > 0
     ctmap_ctnone = ctmask != 0
 
-    # Extract relevant coordinates to interpolate and evaluate at
-    all_coords = np.array(np.where(ctmap_ctnone)).T
-    ct_coords = np.array(np.where(ctmap_ctmask)).T
-    ct_data = ctmask[ct_coords[:,0],ct_coords[:,1]]
+    # Index of the nearest known CT measurement for every pixel, from a single Euclidean 
+    # distance transform rather than building and querying a KD-tree
+    nearest_idx = ndimage.distance_transform_edt(~ctmap_ctmask, return_distances=False, return_indices=True)
 
-    # Build new subregion mask with interpolated valuee
-    new_ctmask = np.zeros_like(ctmask)
-    if mode == "nearest":
-        interp_func = interpolate.NearestNDInterpolator
-    ctmask_interp = interp_func(ct_coords, ct_data)
-    new_ctmask[all_coords[:,0], all_coords[:,1]] = ctmask_interp(all_coords[:,0], all_coords[:,1])
+    # Build new subregion mask with interpolated values
+    new_ctmask = np.where(ctmap_ctnone, ctmask[tuple(nearest_idx)], 0)
 
     return new_ctmask
 
@@ -336,20 +398,10 @@ def measure_grid(map, fovea, scale, eye, interp=True, rotate=0,
             
         # grid_size_half = int(grid_size // 2)
         grid_size = grid_kwds["N_grid"]
-        grid_subgrids = []
-        # grid_subgrids_old = []
-        for l in labels:
-            ud, lr = l
-            ud_str = grid_size - ud
-            lr_str = grid_size - lr if eye == 'Left' else lr+1
-            # lr_quad = lr_locs[lr < grid_size_half]
-            # ud_quad = ud_locs[ud < grid_size_half]
-            # lr_key = grid_size_half - (lr % grid_size_half) if lr < grid_size_half else (lr % grid_size_half)+1
-            # ud_key = grid_size_half - (ud % grid_size_half) if ud < grid_size_half else (ud % grid_size_half)+1
-            # quadrant_old = f"{lr_quad}({lr_key})-{ud_quad}({ud_key})"
-            # grid_subgrids_old.append(quadrant_old)
-            quadrant = f"{ud_str}.{lr_str}"
-            grid_subgrids.append(quadrant)
+        ud_strs = grid_size - np.array([ud for (ud, _) in labels])
+        lr_idx = np.array([lr for (_, lr) in labels])
+        lr_strs = grid_size - lr_idx if eye == 'Left' else lr_idx + 1
+        grid_subgrids = [f"{ud_str}.{lr_str}" for (ud_str, lr_str) in zip(ud_strs, lr_strs)]
             
     elif measure_type == "etdrs":
         output = create_etdrs_grid(scale, fovea, img_shape, rotate, **grid_kwds)
@@ -364,59 +416,53 @@ def measure_grid(map, fovea, scale, eye, interp=True, rotate=0,
         grid_masks = [central] + inner_regions + outer_regions
         grid_subgrids = ["central"] + ["_".join([grid, loc]) for grid in etdrs_regions for loc in etdrs_locs]
 
-    all_mask = (np.sum(np.array(grid_masks), axis=0) > 0).astype(int)
+    all_mask = np.logical_or.reduce(grid_masks)
     if dtype == np.uint64:
         round_idx = 0
     elif dtype == np.float64:
         round_idx = 3
 
-    all_subr_vals = []
+    # Label image of (disjoint) subregions with background labelled K, so every subregion
+    # is reduced in a single pass over the map
+    K = len(grid_masks)
+    lbl = np.full(img_shape, K, dtype=np.int32)
+    for i, mask in enumerate(grid_masks):
+        lbl[mask.astype(bool, copy=False)] = i
+    lbl = lbl.ravel()
+    counts = np.bincount(lbl, minlength=K+1)
+
+    subr_map = map
     if interp:
-        grid_dict = {}
-        gridvol_dict = {}
-        for sub,mask in zip(grid_subgrids, grid_masks):
-            bool_mask = mask.astype(bool)
-            mapmask = map.copy()
-            if np.any(mapmask[bool_mask] == -1):
-                prop_missing = np.round(100*np.sum(mapmask[bool_mask] == -1) / bool_mask.sum(),2)
+        # Missing values are filled by nearest neighbour interpolation over the whole map,
+        # computed at most once and shared by all subregions
+        missing = np.bincount(lbl, weights=(map == -1).ravel(), minlength=K+1)
+        for i, sub in enumerate(grid_subgrids):
+            if missing[i] > 0:
+                prop_missing = np.round(100*missing[i] / counts[i],2)
                 msg = f"{prop_missing}% missing values in {sub} region in {measure_type} grid. Interpolating using nearest neighbour."
                 logging_list.append(msg)
                 logging.warning(msg)
-                mapmask[~bool_mask] = 0
-                mapmask[mapmask == -1] = np.nan
-                mapmask = interp_missing(mapmask)
-            mapmask[~bool_mask] = -1
-            all_subr_vals.append(mapmask)
-            subr_vals = mapmask[bool_mask]
-            if dtype == np.uint64:
-                gridvol_dict[sub] = np.round((delta_xy*subr_vals).sum(),3)
-            grid_dict[sub] = np.round(dtype(subr_vals.mean()),round_idx)
-
-        # Work out average thickness in the entire grid
-        for mapmask in all_subr_vals:
-            mapmask[mapmask == -1] = 0
-        all_subr_mask = map[all_mask.astype(bool)]
-        max_val_etdrs = all_subr_mask.max()
-        if dtype == np.uint64:
-            gridvol_dict["all"] = np.round((delta_xy*all_subr_mask).sum(),3)
-        grid_dict["all"] = np.round(dtype(all_subr_mask.mean()),round_idx)
+        if np.any(missing[:K] > 0):
+            subr_map = interp_missing(np.where(map == -1, np.nan, map))
+    sums = np.bincount(lbl, weights=subr_map.ravel(), minlength=K+1)
 
-    else:
-        grid_dict = {sub : np.round(dtype(map[mask.astype(bool)].mean()),round_idx) for (sub,mask) in zip(grid_subgrids, grid_masks)}
-        all_subr_mask = map[all_mask.astype(bool)]
-        max_val_etdrs = all_subr_mask.max()
-        grid_dict["all"] = np.round(dtype(all_subr_mask.mean()),round_idx)
-        if dtype == np.uint64:
-            gridvol_dict = {sub : np.round((delta_xy*map[mask.astype(bool)]).sum(),3) for (sub,mask) in zip(grid_subgrids, grid_masks)}
-            gridvol_dict["all"] = np.round((delta_xy*all_subr_mask).sum(),3)
-        
-    clip_val = np.quantile(map[map != -1], q=0.995)
+    grid_dict = {sub : np.round(dtype(sums[i]/counts[i]),round_idx) for (i,sub) in enumerate(grid_subgrids)}
+    gridvol_dict = {}
+    if dtype == np.uint64:
+        gridvol_dict = {sub : np.round(delta_xy*sums[i],3) for (i,sub) in enumerate(grid_subgrids)}
 
-    # Plot grid onto map and SLO
+    # Work out average thickness in the entire grid
+    all_subr_mask = map[all_mask]
+    grid_dict["all"] = np.round(dtype(all_subr_mask.mean()),round_idx)
+    if dtype == np.uint64:
+        gridvol_dict["all"] = np.round((delta_xy*all_subr_mask).sum(),3)
+        
+    # Plot grid onto map and SLO, only computing the colour clipping value if needed
     if plot:
         if slo is None:
             print("SLO image not specified. Skipping plot.")
             return grid_dict
+        clip_val = _clip_value(map)
         _ = plot_grid(slo, map, grid_dict, grid_masks, rotate=rotate,
                       measure_type=measure_type, grid_kwds=grid_kwds,
                       fname=fname, save_path=save_path, clip=clip_val)
@@ -425,41 +471,141 @@ def measure_grid(map, fovea, scale, eye, interp=True, rotate=0,
 
 
 
+def _clip_value(ctmap, q=0.995, valid_mask=None):
+    """
+    Linearly interpolated q-quantile of the measured map values, those not -1 unless valid_mask
+    is given, used to clip the colour scale. Only the two neighbouring order statistics are
+    selected, rather than sorting.
+    """
+    if valid_mask is None:
+        valid_mask = ctmap != -1
+    valid = ctmap[valid_mask]
+    pos = (valid.size-1)*q
+    j = int(pos)
+    k = min(j+1, valid.size-1)
+    part = np.partition(valid, [j, k])
+    lo, hi, t = part[j], part[k], pos-j
+    if t >= 0.5:
+        return hi - (hi-lo)*(1-t)
+    return lo + (hi-lo)*t
+
+
+
+def _grid_geometry(masks):
+    """
+    Centroids of grid masks, position of whole-grid label and plottable grid boundaries.
+    """
+    # Detect centroids of masks
+    label_img = _grid_labels(masks)
+    centroids = _grid_centroids(label_img, len(masks))
+    all_centroid = np.array([centroids[-1][0], centroids[-4][1]])
+
+    # Generate grid boundaries
+    bounds = _grid_boundaries(label_img)
+    bounds = ndimage.binary_dilation(bounds, structure=_DILATE_FOOTPRINT)
+
+    return centroids, all_centroid, bounds
+
+
+
+def grid_geometry(scale, fovea, img_shape, rotate, measure_type="etdrs", grid_kwds={"etdrs_microns":(1000,3000,6000)}):
+    """
+    Grid masks, their centroids, position of whole-grid label and plottable grid boundaries
+    for an ETDRS or square grid.
+
+    Geometry is cached by the grid's parameters, as several maps of the same scan share it,
+    so the returned arrays are read-only.
+    """
+    fovea = tuple(np.asarray(fovea).tolist())
+    grid_kwds = tuple((k, tuple(v) if isinstance(v, (list, np.ndarray)) else v) for (k, v) in grid_kwds.items())
+    masks, centroids, all_centroid, bounds = _cached_grid_geometry(scale, fovea, tuple(img_shape), rotate, 
+                                                                   measure_type, grid_kwds)
+    return list(masks), list(centroids), all_centroid, bounds
+
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_grid_geometry(scale, fovea, img_shape, rotate, measure_type, grid_kwds):
+    """
+    Cached implementation of grid_geometry, with hashable arguments.
+    """
+    grid_kwds = dict(grid_kwds)
+    if measure_type == "etdrs":
+        output = create_etdrs_grid(scale, fovea, img_shape, rotate, **grid_kwds)
+        (_, _), (central, _, _), (inner_regions, outer_regions) = output
+        masks = [central] + inner_regions + outer_regions
+    elif measure_type == "square":
+        masks, _, _ = create_square_grid(scale, fovea, img_shape, rotate, **grid_kwds)
+    centroids, all_centroid, bounds = _grid_geometry(masks)
+    for arr in [*masks, *centroids, all_centroid, bounds]:
+        arr.flags.writeable = False
+
+    return tuple(masks), tuple(centroids), all_centroid, bounds
+
+
+
+def _label_fontsizes(values, sizes):
+    """
+    Font sizes of grid value labels, 20 for strings, otherwise sizes[0], sizes[1] or sizes[2]
+    for values in [0,1), [1,1000) or outside of these.
+    """
+    is_str = np.array([isinstance(ct, str) for ct in values], dtype=bool)
+    vals = np.array([np.nan if s else ct for (ct, s) in zip(values, is_str)], dtype=np.float64)
+    small, mid, large = sizes
+    return np.select([is_str, (vals >= 0) & (vals < 1), (vals >= 0) & (vals < 1000)], 
+                     [20, small, mid], large).tolist()
+
+
+
+def _savefig(fig, path, **kwargs):
+    """
+    Save figure, encoding PNGs with fast zlib compression. Pixels are unchanged, 
+    files are only slightly larger.
+    """
+    if os.path.splitext(path)[1].lower() == ".png":
+        kwargs["pil_kwargs"] = {"compress_level": 1}
+    fig.savefig(path, **kwargs)
+
+
+
+def _away_from(coord, centre, offset=50):
+    """
+    Shift coordinate by offset away from centre, used to place the whole-grid label outside the grid.
+    """
+    if coord < centre:
+        return coord - offset
+    elif coord > centre:
+        return coord + offset
+    return coord
+
+
+
 def plot_grid(slo, ctmap, grid_data, masks=None, scale=11.49, clip=None, eye="Right", fovea=np.array([384,384]),
               rotate=0, measure_type="etdrs", grid_kwds={"etdrs_microns":(1000,3000,6000)}, # measure_type="square", grid_kwds={"N_grid":8, "grid_size":7000},
-              cbar=True, img_shape=(768,768), with_grid=True, fname=None, save_path=None, transparent=False):
+              cbar=True, img_shape=(768,768), with_grid=True, fname=None, save_path=None, transparent=False,
+              ctmap_valid_mask=None):
     """
     Plot the etdrs grid thickness values ontop of SLO and Thickness map
+
+    ctmap_valid_mask is an optional boolean map of measured (non-negative) values in ctmap, 
+    computed here if not given.
     """
-    # Build grid masks 
+    # Build grid masks, centroids and boundaries
     if masks is None:
         if slo is not None:
             img_shape = slo.shape
-        if measure_type == "etdrs":
-            output = create_etdrs_grid(scale, fovea, img_shape, rotate, **grid_kwds)
-            (_, _), (central, _, _), (inner_regions, outer_regions) = output
-            if eye =='Right':
-                etdrs_locs = ["superior", "temporal", "inferior", "nasal"]
-            elif eye == 'Left':
-                etdrs_locs = ["superior", "nasal", "inferior", "temporal"]
-            masks = [central] + inner_regions + outer_regions
-        elif measure_type == "square":
-            masks, _, _ = create_square_grid(scale, fovea, img_shape, rotate, **grid_kwds)
+        masks, centroids, all_centroid, bounds = grid_geometry(scale, fovea, img_shape, rotate, 
+                                                               measure_type, grid_kwds)
+    else:
+        centroids, all_centroid, bounds = _grid_geometry(masks)
     M, N = img_shape
-    
-    # Detect centroids of masks
-    centroids = [meas.centroid(region)[[1,0]] for region in masks]
-    all_centroid = np.array([centroids[-1][0], centroids[-4][1]])
 
-    # Generate grid boundaries
-    bounds = np.sum(np.array([segmentation.find_boundaries(mask.astype(bool)) for mask in masks]), axis=0).clip(0,1)
-    bounds = morph.dilation(bounds, footprint=morph.disk(radius=2))
-    bounds = generate_imgmask(bounds)
-
-    # if clipping heatmap
-    mask = ctmap < 0
+    # if clipping heatmap, measured values are found once for both the clip and display mask
+    if ctmap_valid_mask is None:
+        ctmap_valid_mask = ctmap >= 0
+    mask = ~ctmap_valid_mask
     if clip is None:
-        vmax = np.quantile(ctmap[ctmap != -1], q=0.995)
+        vmax = _clip_value(ctmap, valid_mask=ctmap_valid_mask)
     else:
         vmax = clip
 
@@ -469,54 +615,53 @@ def plot_grid(slo, ctmap, grid_data, masks=None, scale=11.49, clip=None, eye="Ri
     else:
         figsize=(9,9)
     fig, ax = plt.subplots(1,1,figsize=figsize)
-    hmax = sns.heatmap(ctmap,
-                    cmap = "rainbow",
-                    alpha = 0.5,
-                    zorder = 2,
-                    vmax = vmax,
-                    mask=mask,
-                    cbar=cbar,
-                    ax = ax)
+    # ctmap is wrapped without copying, not downcast, as matplotlib resamples in float64 anyway.
+    # Continuous images are resampled before colour mapping, avoiding full-size RGBA intermediates
+    hmax = ax.imshow(np.ma.array(ctmap, mask=mask),
+                     cmap = "rainbow",
+                     alpha = 0.5,
+                     zorder = 2,
+                     vmax = vmax,
+                     interpolation = "nearest",
+                     interpolation_stage = "data",
+                     rasterized = True)
+    if cbar:
+        fig.colorbar(hmax, ax=ax)
     if slo is not None:
-        hmax.imshow(slo, cmap="gray",
-                aspect = hmax.get_aspect(),
-                extent = hmax.get_xlim() + hmax.get_ylim(),
-                zorder = 1)
+        ax.imshow(slo, cmap="gray", zorder=1, interpolation_stage="data", rasterized=True)
     ax.set_axis_off()
     if with_grid:
-        ax.imshow(bounds, zorder=3)
-        for (ct, coord) in zip(grid_data.values(), centroids):
-            if isinstance(ct, str):
-                fontsize=20
-            else:
-                if ct // 1 == 0:
-                    fontsize=13.5 + (2-2*cbar)
-                elif ct // 1000 == 0:
-                    fontsize=16 + (2-2*cbar)
-                else:
-                    fontsize=14 + (2-2*cbar)
+        ax.imshow(bounds, cmap=_BOUNDS_CMAP, vmin=0, vmax=1, zorder=3, rasterized=True)
+        fontsizes = _label_fontsizes(list(grid_data.values())[:len(centroids)], 
+                                     (13.5 + (2-2*cbar), 16 + (2-2*cbar), 14 + (2-2*cbar)))
+        for (ct, coord, fontsize) in zip(grid_data.values(), centroids, fontsizes):
             ax.text(s=f"{ct}", x=coord[0], y=coord[1], zorder=4,
                     fontdict={"fontsize":fontsize, 
                               "fontweight":"bold", "ha":"center", "va":"center"})
             
         # Plot average CT across whole grid
         ax.text(s=grid_data["all"], 
-                x=all_centroid[0] - 50*np.sign(N//2-all_centroid[0]), 
-                y=all_centroid[1] - 50*np.sign(M//2-all_centroid[1]),
+                x=_away_from(all_centroid[0], N//2), 
+                y=_away_from(all_centroid[1], M//2),
                 zorder=4, fontdict={"fontsize":fontsize, "fontweight":"bold", "ha":"center", "va":"center"})
 
     # Save out
     if (save_path is not None) and (fname is not None): 
-        fig.savefig(os.path.join(save_path, fname), bbox_inches="tight", transparent=transparent, pad_inches=0)
-        plt.close()
+        _savefig(fig, os.path.join(save_path, fname), bbox_inches="tight", transparent=transparent, pad_inches=0)
+        plt.close(fig)
 
     return fig
 
 
 
-def plot_multiple_grids(all_dict):
+def plot_multiple_grids(all_dict, ctmap_valid_masks=None):
     """
     Plot the etdrs grid thickness values ontop of SLO and Thickness map
+
+    ctmap_valid_masks optionally maps keys of all_dict to boolean maps of measured (non-negative)
+    values in their thickness maps, any missing are computed here.
+
+    The figure is returned open, so callers should close it with plt.close(fig) once saved.
     """
     # Core plotting args
     with_grid = True
@@ -535,88 +680,61 @@ def plot_multiple_grids(all_dict):
     # Work out plotting figure subplots
     N = len(list(all_dict.keys()))-1
     if N == 3:
-        figsize=(2,2)
         fig, axes = plt.subplots(2,2, figsize=(14,14))
     elif N == 2:
-        figsize=(1,3)
         fig, axes = plt.subplots(1,3, figsize=(21,7))
     elif N == 1:
-        figsize=(1,2)
         fig, axes = plt.subplots(1,2, figsize=(14,7))
+    axes = np.asarray(axes).ravel()
 
-    # Build grid masks 
-    output = create_etdrs_grid(scale, fovea, img_shape, rotate, **grid_kwds)
-    (_, _), (central, _, _), (inner_regions, outer_regions) = output
-    if eye == 'Right':
-        etdrs_locs = ["superior", "temporal", "inferior", "nasal"]
-    elif eye == 'Left':
-        etdrs_locs = ["superior", "nasal", "inferior", "temporal"]
-    masks = [central] + inner_regions + outer_regions
-
-    # Detect centroids of masks
-    centroids = [meas.centroid(region)[[1,0]] for region in masks]
-    all_centroid = np.array([centroids[-1][0], centroids[-4][1]])
-
-    # Generate grid boundaries
-    bounds = np.sum(np.array([segmentation.find_boundaries(mask.astype(bool)) for mask in masks]), axis=0).clip(0,1)
-    bounds = morph.dilation(bounds, footprint=morph.disk(radius=2))
-    bounds = generate_imgmask(bounds)
+    # Build grid masks, centroids and boundaries, shared by all maps
+    _, centroids, all_centroid, bounds = grid_geometry(scale, fovea, img_shape, rotate, 
+                                                       measure_type, grid_kwds)
+    all_x, all_y = _away_from(all_centroid[0], 384), _away_from(all_centroid[1], 384)
 
-    plt_indexes = list(np.ndindex(figsize))
-    if figsize[0]==1:
-        ax = axes[0]
-    else:
-        ax = axes[plt_indexes[0]]
-    ax.imshow(slo, cmap='gray')
+    # SLO in first subplot, then maps in row-major order
+    ax = axes[0]
+    ax.imshow(slo, cmap='gray', interpolation_stage="data")
     ax.set_axis_off()
     for idx, plt_key in enumerate(map_keys):
         (ctmap, _, _, _, _, dtype, grid_data, gridvol_data) = all_dict[plt_key]
 
-        if figsize[0]==1:
-            ax = axes[plt_indexes[idx+1][1]]
-        else:
-            ax = axes[plt_indexes[idx+1]]
+        ax = axes[idx+1]
         ax.set_title(plt_key, fontsize=18)
 
-        # clipping heatmap
-        mask = ctmap < 0
-        vmax = np.quantile(ctmap[ctmap != -1], q=0.995)
+        # clipping heatmap, measured values are found once for both the clip and display mask
+        valid_mask = None
+        if ctmap_valid_masks is not None:
+            valid_mask = ctmap_valid_masks.get(plt_key)
+        if valid_mask is None:
+            valid_mask = ctmap >= 0
+        mask = ~valid_mask
+        vmax = _clip_value(ctmap, valid_mask=valid_mask)
 
         # Plot grid on top of thickness map, ontop of SLO
-        hmax = sns.heatmap(ctmap,
-                        cmap = "rainbow",
-                        alpha = 0.5,
-                        zorder = 2,
-                        vmax = vmax,
-                        mask=mask,
-                        cbar=cbar,
-                        ax = ax)
+        hmax = ax.imshow(np.ma.array(ctmap, mask=mask),
+                         cmap = "rainbow",
+                         alpha = 0.5,
+                         zorder = 2,
+                         vmax = vmax,
+                         interpolation = "nearest",
+                         interpolation_stage = "data",
+                         rasterized = True)
+        if cbar:
+            fig.colorbar(hmax, ax=ax)
         if slo is not None:
-            hmax.imshow(slo, cmap="gray",
-                    aspect = hmax.get_aspect(),
-                    extent = hmax.get_xlim() + hmax.get_ylim(),
-                    zorder = 1)
+            ax.imshow(slo, cmap="gray", zorder=1, interpolation_stage="data", rasterized=True)
         ax.set_axis_off()
         if with_grid:
-            ax.imshow(bounds, zorder=3)
-            for (ct, coord) in zip(grid_data.values(), centroids):
-                if isinstance(ct, str):
-                    fontsize=20
-                else:
-                    if ct // 1 == 0:
-                        fontsize=11
-                    elif ct // 1000 == 0:
-                        fontsize=12
-                    else:
-                        fontsize=10
+            ax.imshow(bounds, cmap=_BOUNDS_CMAP, vmin=0, vmax=1, zorder=3, rasterized=True)
+            fontsizes = _label_fontsizes(list(grid_data.values())[:len(centroids)], (11, 12, 10))
+            for (ct, coord, fontsize) in zip(grid_data.values(), centroids, fontsizes):
                 ax.text(s=f"{ct}", x=coord[0], y=coord[1], zorder=4,
                         fontdict={"fontsize":fontsize, 
                                   "fontweight":"bold", "ha":"center", "va":"center"})
                 
             # Plot average CT across whole grid
-            ax.text(s=grid_data["all"], 
-                    x=all_centroid[0] - 50*np.sign(384-all_centroid[0]), 
-                    y=all_centroid[1] - 50*np.sign(384-all_centroid[1]),
+            ax.text(s=grid_data["all"], x=all_x, y=all_y,
                     zorder=4, fontdict={"fontsize":fontsize, "fontweight":"bold", "ha":"center", "va":"center"})
 
 
@@ -624,6 +742,38 @@ def plot_multiple_grids(all_dict):
 
 
 
+def _draw_thickness_profile(ax, raw_thicknesses, ma_thicknesses):
+    """
+    Draw raw and moving average peripapillary thickness profiles on ax, with a twin x-axis 
+    labelling the anatomical sectors.
+    """
+    ax.plot(raw_thicknesses[:,0], raw_thicknesses[:,1], linewidth=1, linestyle="--", color="b")
+    ax.plot(ma_thicknesses[:,0], ma_thicknesses[:,1], linewidth=3, linestyle="-", color="g")
+    ax.set_ylabel("thickness ($\mu$m)", fontsize=18)
+    ax.tick_params(labelsize=16)
+    ax.set_xlim([-180,180])
+    
+    ax2 = ax.twiny()
+    ax2.spines["bottom"].set_position(("axes", -0.10))
+    ax2.tick_params('both', length=0, width=0, which='minor')
+    ax2.tick_params('both', direction='in', which='major')
+    ax2.xaxis.set_ticks_position("bottom")
+    ax2.xaxis.set_label_position("bottom")
+    
+    ax2.set_xticks(_GRID_CUTOFFS)
+    for g in _GRID_CUTOFFS[1:-1]:
+        ax.axvline(g, color='k', linestyle='--')
+    ax.set_xticks(_PROFILE_XTICKS)
+    ax.set_xticklabels(_PROFILE_XTICKLABELS)
+
+    # Tick locators and formatters hold a reference to their axis, so aren't shared between figures
+    ax2.xaxis.set_major_formatter(ticker.NullFormatter())
+    ax2.xaxis.set_minor_locator(ticker.FixedLocator(_XAXIS_LOCS))
+    ax2.xaxis.set_minor_formatter(ticker.FixedFormatter(_RNFL_LOCS))
+    ax2.tick_params(labelsize=20)
+
+
+
 def plot_peripapillary_grid(slo, slo_acq, metadata, grid_values, fovea_at_slo, 
                             raw_thicknesses, ma_thicknesses, 
                             key=None, fname=None, save_path=None):
@@ -632,30 +782,28 @@ def plot_peripapillary_grid(slo, slo_acq, metadata, grid_values, fovea_at_slo,
     '''
     M, N = slo.shape
     circ_mask = slo_acq[...,1] == 1
-    circ_mask_dilate = morph.dilation(circ_mask, footprint=morph.disk(radius=2))
+    circ_mask_dilate = ndimage.binary_dilation(circ_mask, structure=_DILATE_FOOTPRINT)
     acq_radius = metadata["acquisition_radius_px"]
     acq_center = np.array([metadata["acquisition_optic_disc_center_x"], 
                            metadata["acquisition_optic_disc_center_y"]]).astype(int)
 
-    Xy =  np.concatenate([acq_center[np.newaxis], fovea_at_slo[np.newaxis]], axis=0)
-    linmod = LinearRegression().fit(Xy[:,0].reshape(-1,1), Xy[:,1])
-    theta = (np.arctan(linmod.coef_[0])*180)/np.pi
+    # Angle of line through optic disc centre and fovea, horizontal if they're vertically aligned
+    dx = fovea_at_slo[0] - acq_center[0]
+    dy = fovea_at_slo[1] - acq_center[1]
+    theta = np.degrees(np.arctan(dy / dx)) if dx != 0 else 0.0
     grid_masks = create_peripapillary_grid(centre=acq_center, img_shape=slo.shape,
                                                 radius=acq_radius, angle=theta, eye=metadata['eye'])
 
     # Detect centroids of masks
-    centroids = [meas.centroid(region)[[1,0]] for region in grid_masks]
+    label_img = _grid_labels(grid_masks)
+    centroids = _grid_centroids(label_img, len(grid_masks))
     
     # Generate grid boundaries
-    bounds = np.sum(np.array([segmentation.find_boundaries(mask.astype(bool)) for mask in grid_masks]), axis=0).clip(0,1)
-    bounds = morph.dilation(bounds, footprint=morph.disk(radius=2))
-    bounds = generate_imgmask(bounds)
+    bounds = _grid_boundaries(label_img)
+    bounds = ndimage.binary_dilation(bounds, structure=_DILATE_FOOTPRINT)
 
     # Organise the grid values
-    grid_values = pd.DataFrame(grid_values, index=[0])
-    grid_values = dict(grid_values[['temporal_[um]','supero_temporal_[um]','supero_nasal_[um]',
-                                'nasal_[um]','infero_nasal_[um]','infero_temporal_[um]', 'All_[um]',
-                                'PMB_[um]', 'N/T']].iloc[0])
+    grid_values = {key: grid_values[key] for key in _PERIPAPILLARY_KEYS}
 
     # Subplot with the peripapillary grid and thickness profile
     fig, (ax0,ax) = plt.subplots(2,1,figsize=(12,12))
@@ -663,9 +811,11 @@ def plot_peripapillary_grid(slo, slo_acq, metadata, grid_values, fovea_at_slo,
     # Plot SLO with peripapillary grid and annotations
     if key is not None:
         ax0.set_title(f"Layer: {key}", fontsize=20)
-    ax0.imshow(slo, cmap='gray')
-    ax0.imshow(bounds)
-    ax0.imshow(generate_imgmask(circ_mask_dilate,None,1))
+    ax0.imshow(slo, cmap='gray', interpolation_stage="data")
+    # Grid boundaries and acquisition circle composited as one label image, circle on top
+    overlay = bounds.astype(np.uint8)
+    overlay[circ_mask_dilate] = 2
+    ax0.imshow(overlay, cmap=_PERIPAPILLARY_CMAP, vmin=0, vmax=2, interpolation_stage="rgba")
     ax0.scatter(fovea_at_slo[0], fovea_at_slo[1], marker='X', edgecolors=(0,0,0), s=200, color='r')
     
     fontsize=20
@@ -689,33 +839,7 @@ def plot_peripapillary_grid(slo, slo_acq, metadata, grid_values, fovea_at_slo,
     
     
     # Plot the thickness profile as a subplot underneath the peripapillary grid
-    ax.plot(raw_thicknesses[:,0], raw_thicknesses[:,1], linewidth=1, linestyle="--", color="b")
-    ax.plot(ma_thicknesses[:,0], ma_thicknesses[:,1], linewidth=3, linestyle="-", color="g")
-    ax.set_ylabel("thickness ($\mu$m)", fontsize=18)
-    ax.tick_params(labelsize=16)
-    ax.set_xlim([-180,180])
-    
-    
-    ax2 = ax.twiny()
-    ax2.spines["bottom"].set_position(("axes", -0.10))
-    ax2.tick_params('both', length=0, width=0, which='minor')
-    ax2.tick_params('both', direction='in', which='major')
-    ax2.xaxis.set_ticks_position("bottom")
-    ax2.xaxis.set_label_position("bottom")
-    
-    grid_cutoffs = np.array([0, 45, 90, 135, 225, 270, 315, 360]) - 180
-    xaxis_locs = np.array([22.5, 67.5, 112.5, 180, 247.5, 292.5, 337.5]) - 180
-    ax2.set_xticks(grid_cutoffs)
-    for g in grid_cutoffs[1:-1]:
-        ax.axvline(g, color='k', linestyle='--')
-    ax.set_xticks(list(grid_cutoffs[:4]) + [0] + list(grid_cutoffs[4:]))
-    ax.set_xticklabels(list(np.abs(grid_cutoffs[:4])) + [0] + list(grid_cutoffs[4:]))
-    rnfl_anatomical_locs = ["Nasal", "Infero Nasal", "Infero Temporal", "Temporal", 
-                            "Supero Temporal", "Supero Nasal", "Nasal"]
-    ax2.xaxis.set_major_formatter(ticker.NullFormatter())
-    ax2.xaxis.set_minor_locator(ticker.FixedLocator(xaxis_locs))
-    ax2.xaxis.set_minor_formatter(ticker.FixedFormatter(rnfl_anatomical_locs))
-    ax2.tick_params(labelsize=20)
+    _draw_thickness_profile(ax, raw_thicknesses, ma_thicknesses)
     fig.tight_layout()
 
     # Save out with transparent BG
@@ -723,13 +847,15 @@ def plot_peripapillary_grid(slo, slo_acq, metadata, grid_values, fovea_at_slo,
         # matplotlib.rcParams.update({'axes.facecolor':[1,1,1,1],
         #                         'figure.facecolor':[1,1,1,0],
         #                         'savefig.facecolor':[1,1,1,0]})
-        fig.savefig(os.path.join(save_path, f"peripapillary_grid_{fname}.png"), 
-                    bbox_inches="tight", pad_inches=0)
-        plt.close()
+        _savefig(fig, os.path.join(save_path, f"peripapillary_grid_{fname}.png"), 
+                 bbox_inches="tight", pad_inches=0)
+        plt.close(fig)
         # matplotlib.rcParams.update({'axes.facecolor':'white',
         #                         'figure.facecolor':'white',
         #                         'savefig.facecolor': 'auto'})
 
+    return fig
+
 
 def plot_thickness_profile(raw_thicknesses, ma_thicknesses, 
                             key=None, fname=None, save_path=None):
@@ -741,33 +867,8 @@ def plot_thickness_profile(raw_thicknesses, ma_thicknesses,
     if key is not None:
         ax.set_title(f"Layer: {key}", fontsize=20)
     
-    # Plot the thickness profile as a subplot underneath the peripapillary grid
-    ax.plot(raw_thicknesses[:,0], raw_thicknesses[:,1], linewidth=1, linestyle="--", color="b")
-    ax.plot(ma_thicknesses[:,0], ma_thicknesses[:,1], linewidth=3, linestyle="-", color="g")
-    ax.set_ylabel("thickness ($\mu$m)", fontsize=18)
-    ax.tick_params(labelsize=16)
-    ax.set_xlim([-180,180])
-    
-    ax2 = ax.twiny()
-    ax2.spines["bottom"].set_position(("axes", -0.10))
-    ax2.tick_params('both', length=0, width=0, which='minor')
-    ax2.tick_params('both', direction='in', which='major')
-    ax2.xaxis.set_ticks_position("bottom")
-    ax2.xaxis.set_label_position("bottom")
-    
-    grid_cutoffs = np.array([0, 45, 90, 135, 225, 270, 315, 360]) - 180
-    xaxis_locs = np.array([22.5, 67.5, 112.5, 180, 247.5, 292.5, 337.5]) - 180
-    ax2.set_xticks(grid_cutoffs)
-    for g in grid_cutoffs[1:-1]:
-        ax.axvline(g, color='k', linestyle='--')
-    ax.set_xticks(list(grid_cutoffs[:4]) + [0] + list(grid_cutoffs[4:]))
-    ax.set_xticklabels(list(np.abs(grid_cutoffs[:4])) + [0] + list(grid_cutoffs[4:]))
-    rnfl_anatomical_locs = ["Nasal", "Infero Nasal", "Infero Temporal", "Temporal", 
-                            "Supero Temporal", "Supero Nasal", "Nasal"]
-    ax2.xaxis.set_major_formatter(ticker.NullFormatter())
-    ax2.xaxis.set_minor_locator(ticker.FixedLocator(xaxis_locs))
-    ax2.xaxis.set_minor_formatter(ticker.FixedFormatter(rnfl_anatomical_locs))
-    ax2.tick_params(labelsize=20)
+    # Plot the thickness profile
+    _draw_thickness_profile(ax, raw_thicknesses, ma_thicknesses)
     fig.tight_layout()
 
     # Save out with transparent BG
@@ -775,9 +876,11 @@ def plot_thickness_profile(raw_thicknesses, ma_thicknesses,
         # matplotlib.rcParams.update({'axes.facecolor':[1,1,1,1],
         #                         'figure.facecolor':[1,1,1,0],
         #                         'savefig.facecolor':[1,1,1,0]})
-        fig.savefig(os.path.join(save_path, f"thickness_profile_{fname}.png"), 
-                    bbox_inches="tight", pad_inches=0)
-    plt.close()
-    # matplotlib.rcParams.update({'axes.facecolor':'white',
-    #                         'figure.facecolor':'white',
-    #                         'savefig.facecolor': 'auto'})
\ No newline at end of file
+        _savefig(fig, os.path.join(save_path, f"thickness_profile_{fname}.png"), 
+                 bbox_inches="tight", pad_inches=0)
+        plt.close(fig)
+        # matplotlib.rcParams.update({'axes.facecolor':'white',
+        #                         'figure.facecolor':'white',
+        #                         'savefig.facecolor': 'auto'})
+
+    return fig
\ No newline at end of file
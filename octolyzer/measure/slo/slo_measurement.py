@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.ndimage import convolve
@@ -235,6 +236,27 @@ def _create_square_mask(scalex=11.48, center=None, img_shape=(768,768), grid_siz
             print(msg)
 
     return mask, logging
+
+
+
+@functools.lru_cache(maxsize=4)
+def _create_zone_mask(img_shape, od_centre, od_radius, roi_type):
+    """
+    Annulus mask around the optic disc for zone B (2-3 OD radii) or zone C (1-5 OD radii). 
+    
+    Cached for the zones B and C of the current image, as the same zone is measured for each 
+    vessel map. Stored as uint8 to keep cached masks small, and returned mask is read-only.
+    """
+    inner_r, outer_r = {"B":(2,3), "C":(1,5)}[roi_type]
+    log = []
+    od_circ = _create_circular_mask(img_shape=img_shape, radius=inner_r*od_radius, 
+                                    center=od_centre, logging=log, verbose=False)[0]
+    mask, log = _create_circular_mask(img_shape=img_shape, radius=outer_r*od_radius, 
+                                      center=od_centre, logging=log, verbose=False)
+    mask = (mask - od_circ).astype(np.uint8)
+    mask.flags.writeable = False
+
+    return mask, tuple(log)
     
 
 
@@ -494,25 +516,12 @@ def measure_sloroi(binmap, fovea, od_centre, od_radius,
                                             img_shape=img_shape, grid_size=distance, verbose=verbose)
     else:
         od_diameter = 2*od_radius
-        if roi_type == "B":
-            od_circ = _create_circular_mask(img_shape=img_shape, 
-                                        radius=2*od_radius, 
-                                        center=od_centre, verbose=verbose)[0]
-            
-            mask, log  = _create_circular_mask(img_shape=img_shape, 
-                                                radius=3*od_radius, 
-                                                center=od_centre, verbose=verbose)
-            macula_p = 3*od_diameter
-        elif roi_type == "C":
-            od_circ = _create_circular_mask(img_shape=img_shape, 
-                                        radius=od_radius, 
-                                        center=od_centre, verbose=verbose)[0]
-            
-            mask, log = _create_circular_mask(img_shape=img_shape, 
-                                            radius=5*od_radius, 
-                                            center=od_centre, verbose=verbose)
-            macula_p = 5*od_diameter
-        mask -= od_circ
+        mask, log = _create_zone_mask(tuple(img_shape), tuple(int(c) for c in od_centre), 
+                                      int(od_radius), roi_type)
+        macula_p = {"B":3, "C":5}[roi_type]*od_diameter
+        if verbose:
+            for msg in log:
+                print(msg)
     if len(log) > 0:
         logging.extend(log)
 
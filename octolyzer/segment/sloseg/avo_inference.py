@@ -14,6 +14,7 @@ from PIL import Image, ImageOps
 import sys
 from skimage import measure
 from skimage import morphology as morph
+from octolyzer.segment.sloseg import quantize
 
 SCRIPT_PATH = os.path.realpath(os.path.dirname(__file__))
 
@@ -210,14 +211,101 @@ class AVOSegmenter:
         self.postprocess_OD = postprocess_opticdisc
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         #self.device = "mps" if torch.backends.mps.is_available() else "cpu"
-        if local_model_path is not None:
-            self.model = torch.load(local_model_path, map_location=self.device)
+        if local_model_path is not None and self.device == "cpu" and os.path.exists(quantize.int8_model_path(local_model_path)):
+            # INT8 model produced offline by quantize.quantize_segmenter, CPU only
+            self.model = torch.jit.load(quantize.int8_model_path(local_model_path), map_location='cpu')
+        elif local_model_path is not None:
+            # Memory-map the checkpoint rather than reading it eagerly into memory
+            self.model = torch.load(local_model_path, map_location='cpu', mmap=True).to(self.device)
         else:
             self.model = torch.hub.load_state_dict_from_url(model_path, map_location=self.device)
         if self.device != "cpu":
             print("Artery-Vein-Optic disc detection has been loaded with GPU acceleration!")
         self.model.eval()
 
+        # On GPU, convolve in channels_last layout under bfloat16 (or float16) autocast
+        if self.device != "cpu":
+            self.model = self.model.to(memory_format=torch.channels_last)
+            self.amp_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+        # (graph, static input, static output) once captured by analyse_slo._warmup_and_capture
+        self.cuda_graph = None
+
+        # Pinned-host and device input buffers, allocated on first GPU call and reused
+        self._host_in = None
+        self._dev_in = None
+
+    def _to_device(self, img):
+        """Copy a preprocessed image batch to device through persistent pinned-host and device buffers"""
+        if self.device == "cpu":
+            return img
+        if self._dev_in is None or self._dev_in.shape != img.shape:
+            self._host_in = torch.empty(img.shape, pin_memory=True)
+            self._dev_in = torch.empty(img.shape, device=self.device)
+        self._host_in.copy_(img)
+        self._dev_in.copy_(self._host_in, non_blocking=True)
+        return self._dev_in
+
+    def _forward(self, img):
+        """Forward pass on a preprocessed image batch already on device"""
+        # Replay captured CUDA graph if input matches its static shape
+        if self.cuda_graph is not None and img.shape == self.cuda_graph[1].shape:
+            graph, static_in, static_out = self.cuda_graph
+            static_in.copy_(img)
+            graph.replay()
+            return static_out.clone()
+        if self.device == "cpu":
+            return self.model(img).sigmoid()
+        with torch.autocast("cuda", dtype=self.amp_dtype):
+            pred = self.model(img.contiguous(memory_format=torch.channels_last))
+        return pred.float().sigmoid()
+
+    def _postprocess(self, pred, img_shape, vbinmap=None, location=None, soft_pred=False):
+        """Resize and post-process the prediction for a single image"""
+        # Resize back to native resolution
+        if img_shape != (768,768):
+            RESIZE = T.Resize(img_shape, antialias=True)
+            pred = RESIZE(tv_tensors.Image(pred))
+
+        # Return if soft_pred, otherwise post-process
+        if soft_pred:
+            return pred.cpu().numpy()
+
+        # Assuming a binary vessel map from binary SLO segmenter,
+        # i.e. original setup. Threshold on device so only boolean maps are copied back to host
+        if vbinmap is None:
+            pred = (pred > self.threshold).cpu().numpy()
+
+            # Work out vessel class
+            imAV,imA,imV,imOD = pred
+            imA = process_slomap(imA)
+            imV = process_slomap(imV)
+            imAV = process_slomap(imAV) 
+        
+        # If you in put the original vessel binary map, we select artery/vein class
+        # dependent on highest probability from each class' probability map
+        else:
+            pred = pred.cpu().numpy()
+            imOD = (pred[-1] > self.threshold).astype(int)
+            imAV = process_slomap((pred[0] > self.threshold).astype(int))
+            im_A_V1, im_A_V2 = np.zeros(img_shape), np.zeros(img_shape)
+            im_A_V1[vbinmap.astype(bool)] = pred[1:3][:, vbinmap.astype(bool)].argmax(axis=0)+1
+            im_A_V2[imAV.astype(bool)] += pred[1:3][:, imAV.astype(bool)].argmax(axis=0)+1
+            imA = ((im_A_V1 == 1) + (im_A_V2 == 1)).astype(int)
+            imV = ((im_A_V1 == 2) + (im_A_V2 == 2)).astype(int)
+            imAV = (vbinmap + imA + imV).astype(bool).astype(int)
+
+        # Create combined class-wise image
+        imVClass = np.zeros(imAV.shape)
+        imVClass[imAV == 1] = imA[imAV == 1] - imV[imAV == 1]  
+        all_pred = (imAV,imA,imV,imOD,imVClass)
+        imout = combine_classes(all_pred, location, self.postprocess_OD)
+
+        # get optic disc centre
+        od_centre = _get_od_centre(imOD)
+        
+        return imout, od_centre
+
     @torch.inference_mode()
     def predict_img(self, img, vbinmap=None, location=None, soft_pred=False):
         """Inference on a single image"""
@@ -228,60 +316,12 @@ class AVOSegmenter:
             img_shape = img.shape
             img = ImageOps.grayscale(Image.fromarray(img))
 
-        # If downsamples to (768,768), prepare for upsampling
-        if img_shape != (768,768):
-            RESIZE = T.Resize(img_shape, antialias=True)
-        else:
-            RESIZE = None
-
         # Predict segmentation map and post-process
-        with torch.no_grad():
-            img = self.transform(img)
-            img = img.unsqueeze(0).to(self.device)
-            pred = self.model(img).squeeze(0).sigmoid()
-
-            # Resize back to native resolution
-            if RESIZE is not None:
-                pred = RESIZE(tv_tensors.Image(pred))
-
-            # Return if soft_pred, otherwise post-process
-            if soft_pred:
-                return pred.cpu().numpy()
+        img = self.transform(img)
+        img = self._to_device(img.unsqueeze(0))
+        pred = self._forward(img).squeeze(0)
 
-            # Assuming a binary vessel map from binary SLO segmenter,
-            # i.e. original setup
-            pred = pred.cpu().numpy()
-            if vbinmap is None:
-                pred = (pred > self.threshold)
-    
-                # Work out vessel class
-                imAV,imA,imV,imOD = pred
-                imA = process_slomap(imA)
-                imV = process_slomap(imV)
-                imAV = process_slomap(imAV) 
-            
-            # If you in put the original vessel binary map, we select artery/vein class
-            # dependent on highest probability from each class' probability map
-            else:
-                imOD = (pred[-1] > self.threshold).astype(int)
-                imAV = process_slomap((pred[0] > self.threshold).astype(int))
-                im_A_V1, im_A_V2 = np.zeros(img_shape), np.zeros(img_shape)
-                im_A_V1[vbinmap.astype(bool)] = pred[1:3][:, vbinmap.astype(bool)].argmax(axis=0)+1
-                im_A_V2[imAV.astype(bool)] += pred[1:3][:, imAV.astype(bool)].argmax(axis=0)+1
-                imA = ((im_A_V1 == 1) + (im_A_V2 == 1)).astype(int)
-                imV = ((im_A_V1 == 2) + (im_A_V2 == 2)).astype(int)
-                imAV = (vbinmap + imA + imV).astype(bool).astype(int)
-
-            # Create combined class-wise image
-            imVClass = np.zeros(imAV.shape)
-            imVClass[imAV == 1] = imA[imAV == 1] - imV[imAV == 1]  
-            all_pred = (imAV,imA,imV,imOD,imVClass)
-            imout = combine_classes(all_pred, location, self.postprocess_OD)
-
-            # get optic disc centre
-            od_centre = _get_od_centre(imOD)
-            
-            return imout, od_centre
+        return self._postprocess(pred, img_shape, vbinmap=vbinmap, location=location, soft_pred=soft_pred)
 
     def predict_list(self, img_list, vbinmap_list=None, location_list=None, soft_pred=False):
         """Inference on a list of images without batching"""
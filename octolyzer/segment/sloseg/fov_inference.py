@@ -11,6 +11,7 @@ from torchvision.transforms import v2 as T
 from torchvision.transforms import functional as TF
 from torchvision import tv_tensors
 import torch.nn as nn
+from octolyzer.segment.sloseg import quantize
 
 SCRIPT_PATH = os.path.realpath(os.path.dirname(__file__))
 
@@ -143,13 +144,80 @@ class FOVSegmenter:
         self.threshold = threshold
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         #self.device = "mps" if torch.backends.mps.is_available() else "cpu"
-        if local_model_path is not None:
-            self.model = torch.load(local_model_path, map_location=self.device)
+        if local_model_path is not None and self.device == "cpu" and os.path.exists(quantize.int8_model_path(local_model_path)):
+            # INT8 model produced offline by quantize.quantize_segmenter, CPU only
+            self.model = torch.jit.load(quantize.int8_model_path(local_model_path), map_location='cpu')
+        elif local_model_path is not None:
+            # Memory-map the checkpoint rather than reading it eagerly into memory
+            self.model = torch.load(local_model_path, map_location='cpu', mmap=True).to(self.device)
         else:
             self.model = torch.hub.load_state_dict_from_url(model_path, map_location=self.device)
         if self.device != "cpu":
             print("Fovea detection has been loaded with GPU acceleration!")
         self.model.eval()
+
+        # On GPU, convolve in channels_last layout under bfloat16 (or float16) autocast
+        if self.device != "cpu":
+            self.model = self.model.to(memory_format=torch.channels_last)
+            self.amp_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+        # (graph, static input, static output) once captured by analyse_slo._warmup_and_capture
+        self.cuda_graph = None
+
+        # Pinned-host and device input buffers, allocated on first GPU call and reused
+        self._host_in = None
+        self._dev_in = None
+        
+    def _to_device(self, img):
+        """
+        Copy a preprocessed image batch to device through persistent pinned-host and device buffers
+        """
+        if self.device == "cpu":
+            return img
+        if self._dev_in is None or self._dev_in.shape != img.shape:
+            self._host_in = torch.empty(img.shape, pin_memory=True)
+            self._dev_in = torch.empty(img.shape, device=self.device)
+        self._host_in.copy_(img)
+        self._dev_in.copy_(self._host_in, non_blocking=True)
+        return self._dev_in
+
+    def _forward(self, img):
+        """
+        Forward pass on a preprocessed image batch already on device
+        """
+        # Replay captured CUDA graph if input matches its static shape
+        if self.cuda_graph is not None and img.shape == self.cuda_graph[1].shape:
+            graph, static_in, static_out = self.cuda_graph
+            static_in.copy_(img)
+            graph.replay()
+            return static_out.clone()
+        if self.device == "cpu":
+            return self.model(img).sigmoid()
+        with torch.autocast("cuda", dtype=self.amp_dtype):
+            pred = self.model(img.contiguous(memory_format=torch.channels_last))
+        return pred.float().sigmoid()
+
+    def _postprocess(self, pred, img_shape, crop, soft_pred=False):
+        """
+        Crop, resize and extract fovea from the prediction for a single image
+        """
+        M, N = crop
+        pred = pred[:M, :N]
+
+        # Resize back to native resolution
+        if img_shape != (768,768):
+            RESIZE = T.Resize(img_shape, antialias=True)
+            pred = RESIZE(tv_tensors.Image(pred))
+
+        # Copy back to host once, used for both the fovea map and fovea extraction
+        pred = pred.cpu()
+
+        # Return if soft_pred, otherwise post-process
+        if soft_pred:
+            return pred.numpy()[0]
+        fovea = _get_fovea(pred, self.threshold)
+
+        return pred[0].numpy(), fovea
         
     @torch.inference_mode()
     def predict_img(self, img, soft_pred=False):
@@ -163,27 +231,11 @@ class FOVSegmenter:
             img_shape = img.shape
             img = ImageOps.grayscale(Image.fromarray(img))
 
-        # If downsamples to (768,768), prepare for upsampling
-        if img_shape != (768,768):
-            RESIZE = T.Resize(img_shape, antialias=True)
-        else:
-            RESIZE = None
-            
-        with torch.no_grad():
-            img, (M, N) = self.transform(img)
-            img = img.unsqueeze(0).to(self.device)
-            pred = self.model(img).squeeze(0).sigmoid()[:M, :N]
-
-            # Resize back to native resolution
-            if RESIZE is not None:
-                pred = RESIZE(tv_tensors.Image(pred))
-
-            # Return if soft_pred, otherwise post-process
-            if soft_pred:
-                return pred.cpu().numpy()[0]
-            fovea = _get_fovea(pred, self.threshold)
-    
-            return pred[0].cpu().numpy(), fovea
+        img, crop = self.transform(img)
+        img = self._to_device(img.unsqueeze(0))
+        pred = self._forward(img).squeeze(0)
+
+        return self._postprocess(pred, img_shape, crop, soft_pred=soft_pred)
 
     def predict_list(self, img_list, soft_pred=False):
         """Inference on a list of images without batching"""
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import torch
+
+
+def int8_model_path(model_path):
+    """Path of INT8 model stored alongside float checkpoint"""
+    return os.path.splitext(model_path)[0] + "_int8.pt"
+
+
+def quantize_segmenter(segmenter, calibration_imgs, save_path=None, backend="fbgemm"):
+    """
+    One-time, offline post-training static INT8 quantisation of an SLOSegmenter, FOVSegmenter
+    or AVOSegmenter model using FX graph mode quantisation.
+
+    Calibrates on a list of SLO images (paths or arrays), preprocessed as the segmenter would.
+    The quantised model is TorchScript-traced and saved to save_path. Saving it via int8_model_path
+    next to the segmenter's local_model_path means it will be loaded by the segmenter when run on CPU,
+    as quantised kernels are only available for CPU backends (fbgemm for x86, qnnpack for ARM).
+    """
+    # Imported here so segmenters importing this module for int8_model_path don't load 
+    # the FX quantisation stack
+    import copy
+    from PIL import Image, ImageOps
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = backend
+    model = copy.deepcopy(segmenter.model).cpu().eval()
+
+    # Preprocess calibration images, SLO and fovea transforms also return crop shape
+    inputs = []
+    for img in calibration_imgs:
+        if isinstance(img, np.ndarray):
+            img = ImageOps.grayscale(Image.fromarray(img))
+        else:
+            img = ImageOps.grayscale(Image.open(img))
+        img = segmenter.transform(img)
+        if isinstance(img, tuple):
+            img = img[0]
+        inputs.append(img.unsqueeze(0))
+
+    # Observe activation ranges and convert to quantised modules
+    with torch.no_grad():
+        prepared = prepare_fx(model, get_default_qconfig_mapping(backend), example_inputs=(inputs[0],))
+        for img in inputs:
+            prepared(img)
+        qmodel = convert_fx(prepared)
+        qmodel = torch.jit.trace(qmodel, inputs[0])
+
+    if save_path is not None:
+        torch.jit.save(qmodel, save_path)
+
+    return qmodel
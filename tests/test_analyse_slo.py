@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("torch")
+
+from octolyzer import analyse_slo
+
+
+def _synthetic_predictions(N=768):
+    """
+    Build segment_all-style predictions for a synthetic optic disc-centred SLO, with
+    arteries and veins radiating from a non-empty optic disc.
+    """
+    od_centre = np.array([N//2, N//2])
+    fovea = np.array([N//2 - 250, N//2 + 20])
+
+    od_mask = np.zeros((N,N), dtype=np.uint8)
+    cv2.circle(od_mask, tuple(int(c) for c in od_centre), 60, 1, -1)
+
+    artery = np.zeros((N,N), dtype=np.uint8)
+    vein = np.zeros((N,N), dtype=np.uint8)
+    for k, angle in enumerate(np.linspace(0, 2*np.pi, 8, endpoint=False)):
+        end = od_centre + (N//2 - 10)*np.array([np.cos(angle), np.sin(angle)])
+        vessel = artery if k % 2 == 0 else vein
+        cv2.line(vessel, tuple(int(c) for c in od_centre), tuple(int(c) for c in end), 1, 5+k%3)
+    artery[od_mask == 1] = 0
+    vein[od_mask == 1] = 0
+    vein[artery == 1] = 0
+
+    slo_avimout = np.stack([artery, od_mask, vein], axis=-1)
+    slo_vbinmap = (artery | vein).astype(np.uint8)
+    fmask = np.zeros((N,N), dtype=np.float32)
+    cv2.circle(fmask, tuple(int(c) for c in fovea), 10, 1.0, -1)
+
+    return slo_vbinmap, (fmask, fovea), (slo_avimout, od_centre)
+
+
+def test_analyse_precomputed_predictions_plots_optic_disc(tmp_path):
+    # analyse_batch passes precomputed predictions, so analyse must not rely on the
+    # segmentation models' modules having been imported to overlay the optic disc
+    predictions = _synthetic_predictions()
+    slo_vbinmap, _, (slo_avimout, _) = predictions
+    slo = np.full(slo_vbinmap.shape, 100, dtype=np.uint8)
+    slo[slo_vbinmap == 1] = 40
+    slo[slo_avimout[...,1] == 1] = 200
+    save_path = str(tmp_path / "synthetic")
+
+    meta_df, slo_dfs, _, segmentations, _ = analyse_slo.analyse(slo, save_path,
+                                                                location="Optic disc",
+                                                                eye="Right",
+                                                                save_results=False,
+                                                                save_images=True,
+                                                                collate_segmentations=True,
+                                                                verbose=False,
+                                                                predictions=predictions)
+
+    assert (tmp_path / "synthetic" / "synthetic_superimposed.png").exists()
+    assert (tmp_path / "slo_segmentations" / "synthetic.png").exists()
+    assert meta_df.loc[0, "optic_disc_radius_px"] > 0
+    assert len(segmentations) == 3
+    assert len(slo_dfs) > 0